@@ -11,6 +11,8 @@ from alembic import context
 sys.path.append(str(Path(__file__).parent.parent))
 
 from models.base import Base
+from core.settings import DATABASE_URL
+from core.engine import attach_sqlite_pragmas
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -21,6 +23,10 @@ config = context.config
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
 
+# Та же база, что у бота, если она задана в окружении
+if DATABASE_URL:
+    config.set_main_option("sqlalchemy.url", DATABASE_URL)
+
 # add your model's MetaData object here
 # for 'autogenerate' support
 # from myapp import mymodel
@@ -58,7 +64,12 @@ def run_migrations_offline() -> None:
 
 
 def do_run_migrations(connection: Connection) -> None:
-    context.configure(connection=connection, target_metadata=target_metadata)
+    # SQLite не умеет ALTER COLUMN: batch-режим пересоздаёт таблицу с новой схемой
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        render_as_batch=connection.dialect.name == "sqlite",
+    )
 
     with context.begin_transaction():
         context.run_migrations()
@@ -75,6 +86,9 @@ async def run_async_migrations() -> None:
         prefix="sqlalchemy.",
         poolclass=pool.NullPool,
     )
+    if connectable.dialect.name == "sqlite":
+        # Тот же юникодный lower(), что у бота, иначе индексы по lower(name) разойдутся
+        attach_sqlite_pragmas(connectable.sync_engine)
 
     async with connectable.connect() as connection:
         await connection.run_sync(do_run_migrations)
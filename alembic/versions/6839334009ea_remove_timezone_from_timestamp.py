@@ -19,6 +19,9 @@ depends_on: Union[str, Sequence[str], None] = None
 
 
 def upgrade():
+    # В SQLite нет типа с часовым поясом — менять нечего
+    if op.get_bind().dialect.name == 'sqlite':
+        return
     # Изменяем тип колонки, убирая timezone
     op.alter_column('transactions', 'timestamp',
                     existing_type=sa.DateTime(timezone=True),
@@ -26,6 +29,8 @@ def upgrade():
                     existing_nullable=True)
 
 def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        return
     op.alter_column('transactions', 'timestamp',
                     existing_type=sa.DateTime(),
                     type_=sa.DateTime(timezone=True),
@@ -0,0 +1,36 @@
+"""add update idempotency
+
+Revision ID: a6c8e0f2b734
+Revises: f4b7d9e1a523
+Create Date: 2026-03-30 16:42:08.927153
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6c8e0f2b734'
+down_revision: Union[str, Sequence[str], None] = 'f4b7d9e1a523'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('transactions', sa.Column('update_id', sa.BigInteger(), nullable=True))
+    op.create_table('processed_updates',
+    sa.Column('update_id', sa.BigInteger(), autoincrement=False, nullable=False),
+    sa.Column('processed_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False),
+    sa.PrimaryKeyConstraint('update_id')
+    )
+    op.create_index('ix_processed_updates_processed_at', 'processed_updates', ['processed_at'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_processed_updates_processed_at', table_name='processed_updates')
+    op.drop_table('processed_updates')
+    op.drop_column('transactions', 'update_id')
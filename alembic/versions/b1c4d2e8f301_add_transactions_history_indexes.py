@@ -0,0 +1,31 @@
+"""add transactions history indexes
+
+Revision ID: b1c4d2e8f301
+Revises: ec0f0f66a236
+Create Date: 2026-03-02 11:20:41.507318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b1c4d2e8f301'
+down_revision: Union[str, Sequence[str], None] = 'ec0f0f66a236'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_transactions_artikul_timestamp', 'transactions', ['artikul', 'timestamp'])
+    op.create_index('ix_transactions_user_id_timestamp', 'transactions', ['user_id', 'timestamp'])
+    op.create_index('ix_transactions_type_timestamp', 'transactions', ['type', 'timestamp'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_transactions_type_timestamp', table_name='transactions')
+    op.drop_index('ix_transactions_user_id_timestamp', table_name='transactions')
+    op.drop_index('ix_transactions_artikul_timestamp', table_name='transactions')
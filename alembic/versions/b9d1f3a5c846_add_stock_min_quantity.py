@@ -0,0 +1,34 @@
+"""add stock min_quantity
+
+Revision ID: b9d1f3a5c846
+Revises: a6c8e0f2b734
+Create Date: 2026-04-06 10:21:54.503117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b9d1f3a5c846'
+down_revision: Union[str, Sequence[str], None] = 'a6c8e0f2b734'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('stock', sa.Column('min_quantity', sa.Integer(), server_default='0', nullable=False))
+    op.create_index(
+        'ix_stock_low', 'stock', ['artikul'],
+        postgresql_where=sa.text('quantity < min_quantity'),
+        sqlite_where=sa.text('quantity < min_quantity'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_stock_low', table_name='stock')
+    op.drop_column('stock', 'min_quantity')
@@ -0,0 +1,37 @@
+"""add stock name trigram index
+
+Revision ID: c7e9a3f5b210
+Revises: b1c4d2e8f301
+Create Date: 2026-03-09 15:02:13.864120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7e9a3f5b210'
+down_revision: Union[str, Sequence[str], None] = 'b1c4d2e8f301'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # pg_trgm есть только в Postgres; на SQLite /find работает по индексу в памяти
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index(
+        'ix_stock_name_trgm', 'stock', ['name'],
+        postgresql_using='gin',
+        postgresql_ops={'name': 'gin_trgm_ops'},
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.drop_index('ix_stock_name_trgm', table_name='stock')
@@ -0,0 +1,36 @@
+"""add unique lower name index
+
+Revision ID: d3f1b6c8e924
+Revises: c7e9a3f5b210
+Create Date: 2026-03-12 10:47:55.219304
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3f1b6c8e924'
+down_revision: Union[str, Sequence[str], None] = 'c7e9a3f5b210'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Дубликаты, появившиеся до индекса, придётся переименовать вручную
+    duplicates = op.get_bind().execute(sa.text(
+        "SELECT lower(name), count(*) FROM stock GROUP BY lower(name) HAVING count(*) > 1"
+    )).all()
+    if duplicates:
+        names = ", ".join(f"{name} ({count})" for name, count in duplicates)
+        raise RuntimeError(f"В stock есть одинаковые названия, переименуйте их перед миграцией: {names}")
+
+    op.create_index('ux_stock_name_lower', 'stock', [sa.text('lower(name)')], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ux_stock_name_lower', table_name='stock')
@@ -0,0 +1,44 @@
+"""add stock snapshots
+
+Revision ID: e8a2c4d6f017
+Revises: d3f1b6c8e924
+Create Date: 2026-03-18 09:12:37.640581
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8a2c4d6f017'
+down_revision: Union[str, Sequence[str], None] = 'd3f1b6c8e924'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('snapshot_runs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('taken_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False),
+    sa.Column('last_transaction_id', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_snapshot_runs_taken_at', 'snapshot_runs', ['taken_at'])
+    op.create_table('stock_snapshots',
+    sa.Column('run_id', sa.Integer(), nullable=False),
+    sa.Column('artikul', sa.String(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['run_id'], ['snapshot_runs.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('run_id', 'artikul')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('stock_snapshots')
+    op.drop_index('ix_snapshot_runs_taken_at', table_name='snapshot_runs')
+    op.drop_table('snapshot_runs')
@@ -0,0 +1,116 @@
+"""partition transactions by month
+
+Revision ID: f4b7d9e1a523
+Revises: e8a2c4d6f017
+Create Date: 2026-03-24 11:05:12.318904
+
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4b7d9e1a523'
+down_revision: Union[str, Sequence[str], None] = 'e8a2c4d6f017'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# DDL зафиксирован на момент ревизии и не зависит от core.partitions и текущей модели:
+# индексы — те, что создала b1c4d2e8f301, секции вперёд потом досоздаёт сам бот
+INDEXES = (
+    ('ix_transactions_artikul_timestamp', 'artikul'),
+    ('ix_transactions_user_id_timestamp', 'user_id'),
+    ('ix_transactions_type_timestamp', 'type'),
+)
+MONTHS_AHEAD = 3
+
+
+def _add_months(month, count):
+    years, index = divmod(month.month - 1 + count, 12)
+    return date(month.year + years, index + 1, 1)
+
+
+def _create_partition(bind, month):
+    name = f'transactions_y{month:%Y}m{month:%m}'
+    end = _add_months(month, 1)
+    bind.execute(sa.text(f'CREATE TABLE {name} (LIKE transactions INCLUDING DEFAULTS)'))
+    bind.execute(sa.text(
+        f'WITH moved AS (DELETE FROM transactions_default '
+        f'WHERE "timestamp" >= :start AND "timestamp" < :end RETURNING *) '
+        f'INSERT INTO {name} SELECT * FROM moved'
+    ), {'start': month, 'end': end})
+    bind.execute(sa.text(
+        f"ALTER TABLE transactions ATTACH PARTITION {name} FOR VALUES FROM ('{month}') TO ('{end}')"
+    ))
+
+
+def _is_partitioned(bind):
+    return bind.execute(sa.text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = 'transactions' AND pg_table_is_visible(c.oid))"
+    )).scalar()
+
+
+def _swap_table(bind, old):
+    sequence = bind.execute(sa.text("SELECT pg_get_serial_sequence('transactions', 'id')")).scalar()
+    for name, _ in INDEXES:
+        bind.execute(sa.text(f'DROP INDEX IF EXISTS {name}'))
+    bind.execute(sa.text(f'ALTER TABLE transactions RENAME TO {old}'))
+    bind.execute(sa.text(f'ALTER TABLE {old} DROP CONSTRAINT IF EXISTS transactions_pkey'))
+    return sequence
+
+
+def _finish(bind, old, sequence, primary_key):
+    bind.execute(sa.text(f'ALTER TABLE transactions ADD CONSTRAINT transactions_pkey PRIMARY KEY ({primary_key})'))
+    for name, column in INDEXES:
+        bind.execute(sa.text(f'CREATE INDEX {name} ON transactions ({column}, "timestamp")'))
+    if sequence:
+        bind.execute(sa.text(f'ALTER SEQUENCE {sequence} OWNED BY transactions.id'))
+    bind.execute(sa.text(f'DROP TABLE {old} CASCADE'))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Секционирование есть только в Postgres; данные переливаются в новую таблицу
+    # целиком, поэтому на большом журнале миграцию стоит запускать в окно обслуживания
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql' or _is_partitioned(bind):
+        return
+    old = 'transactions_unpartitioned'
+    sequence = _swap_table(bind, old)
+    bind.execute(sa.text(f'UPDATE {old} SET "timestamp" = now() WHERE "timestamp" IS NULL'))
+
+    # Первичный ключ секционированной таблицы обязан включать ключ секционирования
+    bind.execute(sa.text(f'CREATE TABLE transactions (LIKE {old} INCLUDING DEFAULTS) PARTITION BY RANGE ("timestamp")'))
+    bind.execute(sa.text('ALTER TABLE transactions ALTER COLUMN "timestamp" SET NOT NULL'))
+    bind.execute(sa.text('CREATE TABLE transactions_default PARTITION OF transactions DEFAULT'))
+
+    today = date.today().replace(day=1)
+    first = bind.execute(sa.text(f'SELECT min("timestamp") FROM {old}')).scalar()
+    month = first.date().replace(day=1) if first else today
+    last = _add_months(today, MONTHS_AHEAD)
+    while month <= last:
+        _create_partition(bind, month)
+        month = _add_months(month, 1)
+
+    # Индексы строятся после заливки: так быстрее, чем поддерживать их на каждой вставке
+    bind.execute(sa.text(f'INSERT INTO transactions SELECT * FROM {old}'))
+    _finish(bind, old, sequence, 'id, "timestamp"')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Архивированные секции не возвращаются
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql' or not _is_partitioned(bind):
+        return
+    old = 'transactions_partitioned'
+    sequence = _swap_table(bind, old)
+    bind.execute(sa.text(f'CREATE TABLE transactions (LIKE {old} INCLUDING DEFAULTS)'))
+    bind.execute(sa.text('ALTER TABLE transactions ALTER COLUMN "timestamp" DROP NOT NULL'))
+    bind.execute(sa.text(f'INSERT INTO transactions SELECT * FROM {old}'))
+    _finish(bind, old, sequence, 'id')
@@ -0,0 +1,76 @@
+"""Масштабирование изменений по числу разных артикулов при блокировке по ключу.
+
+    python -m bench.artikul_locks --ops 5000 --concurrency 64 --hold-ms 2
+    python -m bench.artikul_locks --ops 5000 --concurrency 64 --database
+
+Без --database критическая секция имитируется asyncio.sleep(hold-ms) под KeyedLocks,
+с --database — настоящие add_quantity() в БД из настроек бота (артикулы LOCK-*).
+Для каждого числа артикулов печатается пропускная способность и доля операций,
+ждавших замок: с одним артикулом операции идут строго по очереди, с ростом числа
+артикулов — параллельно, пока не упрутся в concurrency или пул соединений.
+"""
+import argparse
+import asyncio
+import time
+
+from core.locks import KeyedLocks
+
+
+async def run_clients(ops, concurrency, keys, operation):
+    position = 0
+
+    async def client():
+        nonlocal position
+        while position < ops:
+            i = position
+            position += 1
+            await operation(f"LOCK-{i % keys:05d}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return time.perf_counter() - started
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ops", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--keys", default="1,2,4,8,16,64,256")
+    parser.add_argument("--hold-ms", type=float, default=2)
+    parser.add_argument("--database", action="store_true")
+    args = parser.parse_args()
+    key_counts = [int(value) for value in args.keys.split(",")]
+
+    if args.database:
+        from core.database import init_db, import_stock, add_quantity, artikul_locks
+        await init_db()
+        success, result = await import_stock(
+            {f"LOCK-{i:05d}": (f"Бенчмарк блокировок {i}", 0) for i in range(max(key_counts))}, 0
+        )
+        if not success:
+            raise SystemExit(result)
+        locks = artikul_locks
+
+        async def operation(artikul):
+            await add_quantity(artikul, 1, 0)
+    else:
+        locks = KeyedLocks()
+
+        async def operation(artikul):
+            async with locks.hold([artikul]):
+                await asyncio.sleep(args.hold_ms / 1000)
+
+    baseline = None
+    for keys in key_counts:
+        before = locks.stats()
+        elapsed = await run_clients(args.ops, args.concurrency, keys, operation)
+        after = locks.stats()
+        contended = (after["contended"] - before["contended"]) / args.ops
+        throughput = args.ops / elapsed
+        baseline = baseline or throughput
+        print(f"artikuls={keys:>5}: {throughput:>9,.0f} ops/s  x{throughput / baseline:5.1f}  "
+              f"contended={contended:6.1%}  live locks={after['keys']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,69 @@
+"""Сравнение записи журнала: по строке на транзакцию против group-commit AuditWriter.
+
+    python -m bench.audit_insert --rows 5000 --concurrency 50
+
+Пишет в БД из настроек бота, строки помечаются type='bench' и удаляются в конце.
+"""
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import delete
+
+from core.audit import AuditWriter
+from core.database import SessionLocal, init_db, log_transaction
+from models.transactions import Transaction
+
+
+def bench_row(i):
+    return {"artikul": f"BENCH-{i % 100}", "type": "bench", "quantity": 1, "old_quantity": 0, "new_quantity": 1, "user_id": 0}
+
+
+async def run_clients(rows, concurrency, write):
+    queue = asyncio.Queue()
+    for i in range(rows):
+        queue.put_nowait(i)
+
+    async def client():
+        while not queue.empty():
+            await write(queue.get_nowait())
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return time.perf_counter() - started
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--flush-ms", type=int, default=20)
+    args = parser.parse_args()
+
+    await init_db()
+
+    async def per_row(i):
+        await log_transaction(**bench_row(i))
+
+    elapsed = await run_clients(args.rows, args.concurrency, per_row)
+    print(f"per-row:  {args.rows / elapsed:,.0f} rows/s ({elapsed:.2f}s)")
+
+    writer = AuditWriter(SessionLocal, args.batch_size, args.flush_ms / 1000, args.rows)
+    writer.start()
+
+    async def grouped(i):
+        await writer.submit([bench_row(i)], durable=True)
+
+    elapsed = await run_clients(args.rows, args.concurrency, grouped)
+    await writer.stop()
+    print(f"grouped:  {args.rows / elapsed:,.0f} rows/s ({elapsed:.2f}s), "
+          f"flushes={writer.flushes}, rows/flush={writer.rows_written / max(writer.flushes, 1):.0f}")
+
+    async with SessionLocal() as session:
+        await session.execute(delete(Transaction).where(Transaction.type == "bench"))
+        await session.commit()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,109 @@
+"""Бенчмарк поиска /find на синтетическом каталоге.
+
+    python -m bench.find --items 100000             # триграммный индекс в памяти
+    python -m bench.find --items 100000 --database  # find_items() в БД из настроек бота
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from core.search import NgramIndex
+
+
+TYPES = [
+    "мышь", "клавиатура", "монитор", "кабель", "адаптер", "ноутбук", "наушники", "колонка",
+    "роутер", "принтер", "картридж", "сканер", "флешка", "диск", "блок питания", "зарядное устройство",
+    "коврик", "веб-камера", "микрофон", "удлинитель", "сетевой фильтр", "патч-корд", "коммутатор",
+    "жёсткий диск", "видеокарта", "процессор", "материнская плата", "оперативная память", "кулер",
+    "корпус", "планшет", "смартфон", "чехол", "стилус", "проектор", "экран", "батарейка", "аккумулятор",
+    "термопаста", "кронштейн",
+]
+ATTRIBUTES = [
+    "беспроводная", "механическая", "игровой", "офисный", "чёрный", "белый", "серый", "usb", "usb-c",
+    "hdmi", "displayport", "2м", "5м", "rgb", "bluetooth", "wi-fi", "16гб", "32гб", "1тб", "27\"",
+]
+QUERIES = [
+    "мышь", "клавиатура механ", "монитр", "кабель hdmi", "блок питания", "наушнки", "роутер", "картридж черный",
+    # длинные запросы из многих частых триграмм — худший случай для индекса в памяти
+    "мыш беспроводна", "роутер T5487 bluetooth тонарбел серый", "игровой жёсткий беспроводная диск арвиар",
+]
+
+
+def brands(rnd, count=300):
+    syllables = ["ка", "ро", "ми", "то", "лек", "сон", "ви", "тек", "за", "бел", "ар", "нео", "плюс", "тон", "ди"]
+    return ["".join(rnd.choice(syllables) for _ in range(rnd.randint(2, 3))) for _ in range(count)]
+
+
+def catalogue(items, seed=42):
+    # Каталог вида «тип бренд модель атрибуты»: названия в реальном складе разнообразнее,
+    # чем перестановки нескольких слов, и почти каждая триграмма модели редкая
+    rnd = random.Random(seed)
+    brand_names = brands(rnd)
+    for i in range(items):
+        model = f"{rnd.choice('ABCDEFGHKMPRSTX')}{rnd.randint(10, 9999)}"
+        attributes = rnd.sample(ATTRIBUTES, rnd.randint(0, 2))
+        name = " ".join([rnd.choice(TYPES), rnd.choice(brand_names), model, *attributes])
+        yield f"B-{i:06d}", name
+
+
+def report(label, timings):
+    timings.sort()
+    p = lambda q: timings[min(int(len(timings) * q), len(timings) - 1)] * 1000
+    print(f"{label}: p50={p(0.5):.2f}ms p95={p(0.95):.2f}ms p99={p(0.99):.2f}ms max={timings[-1] * 1000:.2f}ms")
+
+
+def bench_memory(items, rounds, limit):
+    index = NgramIndex()
+    started = time.perf_counter()
+    index.load(catalogue(items))
+    print(f"index build: {time.perf_counter() - started:.2f}s for {len(index)} items")
+
+    timings = []
+    for _ in range(rounds):
+        for query in QUERIES:
+            started = time.perf_counter()
+            index.search(query, limit)
+            timings.append(time.perf_counter() - started)
+    report("in-memory", timings)
+
+
+async def bench_database(items, rounds, limit):
+    from sqlalchemy import delete, insert
+    from core.database import SessionLocal, init_db, find_items
+    from models.stock import Stock
+
+    await init_db()
+    async with SessionLocal() as session:
+        await session.execute(insert(Stock), [{"artikul": a, "name": n, "quantity": 0} for a, n in catalogue(items)])
+        await session.commit()
+    try:
+        timings = []
+        for _ in range(rounds):
+            for query in QUERIES:
+                started = time.perf_counter()
+                await find_items(query, limit)
+                timings.append(time.perf_counter() - started)
+        report("database", timings)
+    finally:
+        async with SessionLocal() as session:
+            await session.execute(delete(Stock).where(Stock.artikul.like("B-%")))
+            await session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=100_000)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--database", action="store_true")
+    args = parser.parse_args()
+
+    if args.database:
+        asyncio.run(bench_database(args.items, args.rounds, args.limit))
+    else:
+        bench_memory(args.items, args.rounds, args.limit)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Бенчмарк потоковой выгрузки истории: время и пиковая память на N транзакций.
+
+    python -m bench.history_export --rows 1000000
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from excel.excel import history_report
+
+
+async def fake_history(rows, batch_size):
+    # Имитация get_history(): те же кортежи, теми же пачками
+    start = datetime(2026, 1, 1)
+    batch = []
+    for i in range(1, rows + 1):
+        qty = i % 50 + 1
+        batch.append((i, f"A-{i % 5000:04d}", "add" if i % 3 else "remove", qty, 100, 100 + qty, 123456789, None, start + timedelta(seconds=i)))
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    _, content = await history_report(fake_history(args.rows, args.batch_size))
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    size = len(content)
+    print(f"rows={args.rows} time={elapsed:.1f}s rows/s={args.rows / elapsed:,.0f} "
+          f"peak_python_mem={peak / 2**20:.1f} MiB file={size / 2**20:.1f} MiB")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
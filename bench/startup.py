@@ -0,0 +1,49 @@
+"""Время холодного старта: импорт хендлеров и init_db в свежем процессе.
+
+    python -m bench.startup --runs 5
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+
+PROBE = """
+import asyncio, json, time
+started = time.perf_counter()
+import bot.handlers
+imported = time.perf_counter()
+from core.database import init_db, engine
+asyncio.run(init_db())
+ready = time.perf_counter()
+import sys
+print(json.dumps({
+    "import_handlers": imported - started,
+    "init_db": ready - imported,
+    "total": ready - started,
+    "openpyxl_loaded": "openpyxl" in sys.modules,
+}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    root = Path(__file__).resolve().parent.parent
+    results = []
+    for _ in range(args.runs):
+        output = subprocess.run([sys.executable, "-c", PROBE], cwd=root, capture_output=True, text=True, check=True)
+        results.append(json.loads(output.stdout.strip().splitlines()[-1]))
+
+    for key in ("import_handlers", "init_db", "total"):
+        values = [result[key] * 1000 for result in results]
+        print(f"{key}: median={statistics.median(values):.0f}ms min={min(values):.0f}ms max={max(values):.0f}ms")
+    print(f"openpyxl imported at startup: {results[0]['openpyxl_loaded']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Нагрузочный тест webhook-режима: шлёт синтетические апдейты и считает updates/s.
+
+Скрипт сам поднимает заглушку Bot API, поэтому ответы бота не уходят в Telegram.
+Воркер запускается так:
+
+    RUN_MODE=webhook WEBHOOK_REGISTER=0 WEBHOOK_SECRET=bench TELEGRAM_API_URL=http://127.0.0.1:8081 python main.py
+
+а затем:
+
+    python -m bench.webhook_load --updates 5000 --concurrency 100 --user-id <id из белого списка>
+
+update_id апдейтов — run_id * 1_000_000 + i, где run_id по умолчанию время запуска: иначе
+повторный прогон против того же воркера целиком отбросил бы дедупликатор апдейтов,
+и замер показал бы его, а не работу хендлеров.
+"""
+import argparse
+import asyncio
+import time
+
+from aiohttp import ClientSession, web
+
+
+def make_update(update_id, user_id, text):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Bench"},
+            "text": text,
+        },
+    }
+
+
+async def start_stub_api(port, replies):
+    # Любой метод Bot API отвечает «успешно отправленным» сообщением
+    async def handle(request):
+        replies.append(time.perf_counter())
+        return web.json_response({"ok": True, "result": {
+            "message_id": len(replies),
+            "date": int(time.time()),
+            "chat": {"id": 0, "type": "private"},
+            "text": "ok",
+        }})
+
+    app = web.Application()
+    app.router.add_route("POST", "/{tail:.*}", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8080/webhook")
+    parser.add_argument("--secret", default="bench")
+    parser.add_argument("--api-port", type=int, default=8081)
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--user-id", type=int, required=True)
+    parser.add_argument("--text", default="/stock A-001")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--run-id", type=int, default=int(time.time()),
+                        help="update_id = run_id * 1_000_000 + i; по умолчанию время запуска, "
+                             "чтобы повторные прогоны не попадали в дедупликацию апдейтов")
+    args = parser.parse_args()
+
+    replies = []
+    stub = await start_stub_api(args.api_port, replies)
+    headers = {"X-Telegram-Bot-Api-Secret-Token": args.secret}
+    queue = asyncio.Queue()
+    for i in range(1, args.updates + 1):
+        queue.put_nowait(args.run_id * 1_000_000 + i)
+    latencies = []
+    failed = 0
+
+    async def client(session):
+        nonlocal failed
+        while not queue.empty():
+            update_id = queue.get_nowait()
+            started = time.perf_counter()
+            async with session.post(args.url, json=make_update(update_id, args.user_id, args.text), headers=headers) as response:
+                await response.read()
+                if response.status != 200:
+                    failed += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    async with ClientSession() as session:
+        await asyncio.gather(*(client(session) for _ in range(args.concurrency)))
+    posted = time.perf_counter() - started
+
+    # Ждём, пока бот ответит на все апдейты (каждый /stock даёт один вызов Bot API)
+    deadline = time.perf_counter() + args.timeout
+    while len(replies) < args.updates and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+    finished = (replies[-1] if replies else time.perf_counter()) - started
+    await stub.cleanup()
+
+    latencies.sort()
+    p = lambda q: latencies[min(int(len(latencies) * q), len(latencies) - 1)] * 1000
+    print(f"posted {args.updates} updates in {posted:.2f}s: {args.updates / posted:,.0f} req/s, failed={failed}")
+    print(f"POST latency p50={p(0.5):.1f}ms p95={p(0.95):.1f}ms p99={p(0.99):.1f}ms")
+    print(f"bot replies: {len(replies)} in {finished:.2f}s: {len(replies) / finished:,.0f} updates/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
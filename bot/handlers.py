@@ -1,13 +1,23 @@
-from aiogram import Router
-from aiogram.types import Message, FSInputFile
+from aiogram import Router, F
+from aiogram.types import Message, BufferedInputFile
 from aiogram.filters import Command
+from datetime import datetime
 from core.config import ALLOWED_USER_IDS
-from core.database import get_item, add_quantity, remove_quantity, get_all_stock, rename_item, delete_item, new_item, get_history
-from excel.excel import create_stock_report, history_report
+from core.settings import HISTORY_PAGE_SIZE, LOW_LIMIT
+from core.metrics import command_seconds, command_errors, commands_in_flight, db_call_seconds
+from core.database import get_item, add_quantity, remove_quantity, add_quantities, remove_quantities, get_all_stock, rename_item, delete_item, new_item, get_history, get_history_page, get_data_version, import_stock, pool_stats, stock_cache, find_items, get_item_at, artikul_locks, update_dedupe, set_min_quantity, get_low_stock
+from excel.excel import stock_report, history_report
+from excel.cache import report_cache, CachedReport
+from excel.importer import parse_stock_file
+from excel.runner import run_in_pool, report_slot
+from bot.middlewares import MetricsMiddleware, IdempotencyMiddleware, AuditErrorMiddleware
 from logger.logger import logger
 
 
 router = Router()
+router.message.middleware(MetricsMiddleware())
+router.message.middleware(IdempotencyMiddleware(update_dedupe))
+router.message.middleware(AuditErrorMiddleware())
 
 def check_access(user_id):
     return user_id in ALLOWED_USER_IDS
@@ -23,6 +33,65 @@ def log_action(user_id, command, message, **extra):
         }
     )
 
+async def send_report(message, kind, filters, build):
+    version = await get_data_version(message.from_user.id)
+    report = report_cache.get(kind, filters, version)
+
+    if report is None:
+        filename, content = await build()
+        report = CachedReport(filename, content)
+        report_cache.put(kind, filters, version, report)
+
+    # Если этот отчёт уже отправлялся, повторно используем file_id без загрузки файла
+    document = report.file_id or BufferedInputFile(report.content, filename=report.filename)
+    sent = await message.answer_document(document, caption=f"Отчет на {report.filename}")
+
+    if report.file_id is None and sent.document:
+        report.file_id = sent.document.file_id
+    return report.filename
+
+def parse_batch(lines):
+    # Каждая строка: «артикул количество»; одинаковые артикулы суммируются
+    items = {}
+    errors = []
+    for number, line in enumerate(lines, 1):
+        parts = line.rsplit(maxsplit=1)
+        if len(parts) != 2:
+            errors.append(f"Строка {number}: формат «A-001 10»")
+            continue
+        artikul = parts[0].upper()
+        try:
+            quantity = int(parts[1])
+        except ValueError:
+            errors.append(f"Строка {number}: количество должно быть числом")
+            continue
+        if quantity <= 0:
+            errors.append(f"Строка {number}: число должно быть положительным")
+            continue
+        items[artikul] = items.get(artikul, 0) + quantity
+    return items, errors
+
+async def apply_batch(message, user_id, command, text, apply):
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    items, errors = parse_batch(lines)
+    if errors:
+        log_action(user_id, command, f"пакет отклонён: {'; '.join(errors)}")
+        await message.answer("Пакет не применён:\n" + "\n".join(errors))
+        return
+
+    success, result = await apply(items, user_id)
+    if not success:
+        log_action(user_id, command, f"пакет отклонён: {'; '.join(result)}")
+        await message.answer("Пакет не применён:\n" + "\n".join(result))
+        return
+
+    # Telegram ограничивает длину сообщения, поэтому длинную сводку обрезаем
+    summary = "\n".join(f"{artikul} - {name}: {old_qty} → {new_qty}" for artikul, name, old_qty, new_qty in result[:50])
+    if len(result) > 50:
+        summary += f"\n…и ещё {len(result) - 50}"
+    log_action(user_id, command, f"пакет из {len(result)} позиций: успех")
+    await message.answer(f"Обработано позиций: {len(result)}\n{summary}")
+
 @router.message(Command('start'))
 async def cmd_start(message : Message):
     user_id = message.from_user.id
@@ -37,15 +106,23 @@ async def cmd_start(message : Message):
         "Добро пожаловать!\n\n"
         "**Для существующих товаров:**\n"
         "/add A-001 50 — добавить количество\n"
-        "/remove A-001 2 — списать\n\n"
+        "/remove A-001 2 — списать\n"
+        "Несколько позиций — по одной «A-001 50» на строку\n\n"
         "**Для новых товаров:**\n"
         "/new A-999 Название товара — создать товар\n\n"
         "**Проверка:**\n"
         "/stock A-001 — узнать остаток\n"
+        "/stock A-001 2026-03-01 — остаток на дату\n"
+        "/find мышь — найти товар по названию\n"
         "/rename A-001 Новое название — переименовать\n"
-        "/delete A-001 — удалить товар\n\n"
+        "/delete A-001 — удалить товар\n"
+        "/min A-001 5 — минимальный остаток для оповещений (0 — снять)\n"
+        "/low — товары ниже минимального остатка\n\n"
         "**Отчёты:**\n"
-        "/report — выгрузить Excel"
+        "/report — выгрузить Excel\n"
+        "/history A-001 type=remove from=2026-03-01 — история операций с фильтрами\n\n"
+        "**Импорт:**\n"
+        "Пришлите XLSX или CSV в формате отчёта /report — остатки будут загружены целиком"
     )
 
 @router.message(Command('stock'))
@@ -58,9 +135,31 @@ async def cmd_stock(message : Message):
     
 
     text = message.text.replace("/stock", "", 1).strip()
+
+    # /stock A-001 2026-03-01 — остаток на конец указанного дня
+    day = None
+    parts = text.rsplit(maxsplit=1)
+    if len(parts) == 2:
+        try:
+            day = datetime.strptime(parts[1], "%Y-%m-%d").date()
+            text = parts[0]
+        except ValueError:
+            pass
     
     artikul = text.upper()
-    item = await get_item(artikul)
+
+    if day:
+        item = await get_item_at(artikul, day)
+        if not item:
+            log_action(user_id, f"/stock {artikul} {day}", "товара не было")
+            await message.answer(f"Товара {artikul} на {day} не было")
+            return
+        name, quantity = item
+        log_action(user_id, f"/stock {artikul} {day}", f"успех: {quantity} шт.")
+        await message.answer(f"{artikul} - {name}\nОстаток на {day}: {quantity} шт.")
+        return
+
+    item = await get_item(artikul, user_id)
 
     if not item:
         log_action(user_id, f"/stock {artikul}", "товар не найден")
@@ -72,6 +171,31 @@ async def cmd_stock(message : Message):
     await message.answer(f"{artikul} - {name}\nОстаток: {quantity} шт.")
 
 
+@router.message(Command('find'))
+async def cmd_find(message: Message):
+    user_id = message.from_user.id
+    if not check_access(user_id):
+        log_action(user_id, "/find", "доступ запрещён")
+        await message.answer("Доступ запрещён")
+        return
+
+    query = message.text.replace("/find", "", 1).strip()
+    if len(query) < 2:
+        await message.answer("Формат: /find мышь")
+        return
+
+    items = await find_items(query)
+
+    if not items:
+        log_action(user_id, f"/find {query}", "ничего не найдено")
+        await message.answer(f"По запросу «{query}» ничего не найдено")
+        return
+
+    lines = [f"{artikul} - {name}: {quantity} шт." for artikul, name, quantity in items]
+    log_action(user_id, f"/find {query}", f"найдено {len(items)}")
+    await message.answer("\n".join(lines))
+
+
 @router.message(Command("add"))
 async def cmd_add(message: Message):
     user_id = message.from_user.id
@@ -81,6 +205,10 @@ async def cmd_add(message: Message):
         return
     
     text = message.text.replace("/add", "", 1).strip()
+
+    if "\n" in text:
+        await apply_batch(message, user_id, "/add", text, add_quantities)
+        return
     
     parts = text.rsplit(maxsplit=1)
     
@@ -97,15 +225,14 @@ async def cmd_add(message: Message):
     
     if quantity <= 0:
         await message.answer("Число должно быть положительным и не равным нулю")
+        return
     
-    item = await get_item(artikul)
+    item_data = await add_quantity(artikul, quantity, user_id)
 
-    if not item:
+    if not item_data:
         log_action(user_id, f"/add {artikul}", "товар не найден")
         await message.answer(f"Товар {artikul} не найден, проверьте артикул или используйте /new для создания")
         return
-    
-    item_data = await add_quantity(artikul, quantity, user_id)
 
     log_action(user_id, f"/add {artikul} {quantity}", f"успех: новый остаток {item_data}")
     await message.answer(f" Добавлено {quantity} шт.\n{artikul} - {item_data[0]}\nТекущий остаток: {item_data[1]} шт.")
@@ -120,6 +247,10 @@ async def cmd_remove(message : Message):
     
     text = message.text.replace("/remove", "", 1).strip()
 
+    if "\n" in text:
+        await apply_batch(message, user_id, "/remove", text, remove_quantities)
+        return
+
     text = text.split()
     if len(text) != 2:
         await message.answer("Формат /remove A-001 2")
@@ -131,6 +262,10 @@ async def cmd_remove(message : Message):
     except ValueError:
         await message.answer("Количество должно быть числом")
         return
+
+    if quantity <= 0:
+        await message.answer("Число должно быть положительным и не равным нулю")
+        return
     
     success, result = await remove_quantity(artikul, quantity, user_id)
 
@@ -152,11 +287,10 @@ async def cmd_report(message: Message):
     
     await message.answer("Генерирую отчет")
 
-    data = await get_all_stock()
-    filename = create_stock_report(data)
+    async def build():
+        return await stock_report(await get_all_stock(user_id))
 
-    doc = FSInputFile(filename)
-    await message.answer_document(doc, caption=f"Отчет на {filename}")
+    filename = await send_report(message, "stock", (), build)
 
     log_action(user_id, "/report", f"успех: {filename}")
 
@@ -204,7 +338,7 @@ async def cmd_delete(message:Message):
         return
     
     artikul = parts[1].upper()
-    item = await get_item(artikul)
+    item = await get_item(artikul, user_id)
 
     if not item:
         log_action(user_id, f"/delete {artikul}", "товар не найден")
@@ -268,6 +402,48 @@ async def cmd_new(message:Message):
 
 
 
+def parse_history_filters(text):
+    # /history A-001 type=remove user=123 from=2026-03-01 to=2026-03-31 after=500 xlsx
+    filters = {}
+    as_excel = False
+    artikul = []
+    for token in text.split():
+        key, sep, value = token.partition("=")
+        key = key.lower()
+        if not sep:
+            if key == "xlsx":
+                as_excel = True
+            else:
+                artikul.append(token.upper())
+            continue
+        try:
+            if key == "type":
+                filters["type"] = value.lower()
+            elif key == "user":
+                filters["user_id"] = int(value)
+            elif key == "from":
+                filters["date_from"] = datetime.strptime(value, "%Y-%m-%d")
+            elif key == "to":
+                filters["date_to"] = datetime.strptime(value, "%Y-%m-%d")
+            elif key == "after":
+                filters["after_id"] = int(value)
+            else:
+                return None, False, f"Неизвестный фильтр {key}"
+        except ValueError:
+            return None, False, f"Неверное значение фильтра {key}: {value}"
+    if artikul:
+        filters["artikul"] = " ".join(artikul)
+    return filters, as_excel, None
+
+def format_history_page(rows):
+    lines = []
+    for id, artikul, type, quantity, old_qty, new_qty, user_id, details, timestamp in rows:
+        when = timestamp.strftime("%Y-%m-%d %H:%M") if timestamp else "—"
+        change = f" {quantity} ({old_qty} → {new_qty})" if quantity is not None else ""
+        extra = f" {details}" if details else ""
+        lines.append(f"#{id} {when} {artikul} {type}{change}{extra} user {user_id}")
+    return "\n".join(lines)
+
 @router.message(Command('history'))
 async def cmd_history(message : Message):
     user_id = message.from_user.id
@@ -275,14 +451,162 @@ async def cmd_history(message : Message):
         log_action(user_id, "/history", "доступ запрещён")
         await message.answer(" Доступ запрещён")
         return
+
+    text = message.text.replace("/history", "", 1).strip()
+    filters, as_excel, error = parse_history_filters(text)
+    if error:
+        await message.answer(f"{error}\nФормат: /history A-001 type=remove user=123 from=2026-03-01 to=2026-03-31")
+        return
+
+    if filters and not as_excel:
+        # С фильтрами отвечаем текстовой страницей; +1 строка показывает, есть ли продолжение
+        rows = await get_history_page(filters, HISTORY_PAGE_SIZE + 1, user_id)
+        if not rows:
+            await message.answer("Операций не найдено")
+            return
+        page = format_history_page(rows[:HISTORY_PAGE_SIZE])
+        if len(rows) > HISTORY_PAGE_SIZE:
+            next_text = " ".join(token for token in text.split() if not token.lower().startswith("after="))
+            page += f"\n\nДальше: /history {next_text} after={rows[HISTORY_PAGE_SIZE - 1][0]}"
+        log_action(user_id, f"/history {text}", f"успех: {min(len(rows), HISTORY_PAGE_SIZE)} строк")
+        await message.answer(page)
+        return
     
     await message.answer("Генерирую отчет по истории операций")
 
-    data = await get_history()
-    filename = history_report(data)
+    key = tuple(sorted(filters.items()))
+    filename = await send_report(message, "history", key, lambda: history_report(get_history(filters, user_id=user_id)))
 
-    doc = FSInputFile(filename)
-    await message.answer_document(doc, caption=f"Отчет на {filename}")
+    log_action(user_id, f"/history {text}".strip(), f"успех: {filename}")
 
-    log_action(user_id, "/report", f"успех: {filename}")
 
+def format_latency(histogram, label):
+    p50 = histogram.quantile(0.5, label)
+    p95 = histogram.quantile(0.95, label)
+    count = histogram.values[(label,)][-1]
+    return f"{label}: {count} шт., p50 ≤ {p50 * 1000:.0f} мс, p95 ≤ {p95 * 1000:.0f} мс"
+
+@router.message(Command('min'))
+async def cmd_min(message: Message):
+    user_id = message.from_user.id
+    if not check_access(user_id):
+        log_action(user_id, "/min", "доступ запрещён")
+        await message.answer("Доступ запрещён")
+        return
+
+    parts = message.text.split()
+    if len(parts) != 3:
+        await message.answer("Формат: /min A-001 5 (0 — снять порог)")
+        return
+
+    artikul = parts[1].upper()
+    try:
+        minimum = int(parts[2])
+    except ValueError:
+        await message.answer("Порог должен быть числом")
+        return
+    if minimum < 0:
+        await message.answer("Порог не может быть отрицательным")
+        return
+
+    success, result = await set_min_quantity(artikul, minimum, user_id)
+    log_action(user_id, f"/min {artikul} {minimum}", "успех" if success else f"ошибка: {result}")
+    await message.answer(result)
+
+
+@router.message(Command('low'))
+async def cmd_low(message: Message):
+    user_id = message.from_user.id
+    if not check_access(user_id):
+        log_action(user_id, "/low", "доступ запрещён")
+        await message.answer("Доступ запрещён")
+        return
+
+    rows = await get_low_stock(LOW_LIMIT, user_id)
+    if not rows:
+        log_action(user_id, "/low", "все остатки выше минимума")
+        await message.answer("Все остатки выше минимума")
+        return
+
+    lines = ["Ниже минимального остатка:"]
+    for artikul, name, quantity, minimum in rows[:LOW_LIMIT]:
+        lines.append(f"{artikul} - {name}: {quantity} шт. (минимум {minimum})")
+    if len(rows) > LOW_LIMIT:
+        lines.append(f"…показаны первые {LOW_LIMIT}")
+    log_action(user_id, "/low", f"успех: {min(len(rows), LOW_LIMIT)} позиций")
+    await message.answer("\n".join(lines))
+
+
+@router.message(Command('stats'))
+async def cmd_stats(message: Message):
+    user_id = message.from_user.id
+    if not check_access(user_id):
+        log_action(user_id, "/stats", "доступ запрещён")
+        await message.answer("Доступ запрещён")
+        return
+
+    lines = ["Команды:"]
+    for (command,) in sorted(command_seconds.values):
+        errors = command_errors.values.get((command,), 0)
+        in_flight = commands_in_flight.values.get((command,), 0)
+        lines.append(f"{format_latency(command_seconds, command)}, ошибок {errors}, в работе {in_flight}")
+
+    lines.append("\nБаза данных:")
+    for (function,) in sorted(db_call_seconds.values):
+        lines.append(format_latency(db_call_seconds, function))
+
+    pool = pool_stats()
+    cache = stock_cache.stats()
+    lines.append(f"\nПул: занято {pool['checked_out']}/{pool['capacity']}, пик {pool['max_checked_out']}, "
+                 f"ожидание ср. {pool['wait_avg_ms']:.1f} мс, макс. {pool['wait_max_ms']:.1f} мс")
+    lines.append(f"Кэш остатков: {cache['size']}/{cache['maxsize']}, попадания {cache['hits']}, промахи {cache['misses']}")
+    dedupe = update_dedupe.stats()
+    lines.append(f"Повторные апдейты: отброшено {dedupe['dropped_memory']} по кэшу, {dedupe['dropped_db']} по базе")
+    locks = artikul_locks.stats()
+    lines.append(f"Блокировки артикулов: {locks['acquisitions']}, с ожиданием {locks['contended']}, "
+                 f"ожидание ср. {locks['wait_avg_ms']:.1f} мс, макс. {locks['wait_max_ms']:.1f} мс")
+
+    log_action(user_id, "/stats", "успех")
+    await message.answer("\n".join(lines))
+
+
+@router.message(F.document)
+async def import_document(message: Message):
+    user_id = message.from_user.id
+    if not check_access(user_id):
+        log_action(user_id, "/import", "доступ запрещён")
+        await message.answer("Доступ запрещён")
+        return
+
+    filename = message.document.file_name or ""
+    if not filename.lower().endswith((".xlsx", ".csv")):
+        await message.answer("Для импорта нужен файл .xlsx или .csv в формате отчёта /report")
+        return
+
+    await message.answer("Загружаю остатки из файла")
+
+    buffer = await message.bot.download(message.document)
+    try:
+        async with report_slot():
+            items, errors = await run_in_pool(parse_stock_file, filename, buffer.getvalue())
+    except Exception as e:
+        # Повреждённый .xlsx и т.п.: пользователь должен получить ответ, а не тишину
+        log_action(user_id, f"/import {filename}", f"ошибка чтения: {e}")
+        await message.answer(f"Не удалось прочитать файл: {e}")
+        return
+
+    if errors:
+        log_action(user_id, f"/import {filename}", f"ошибка: {'; '.join(errors)}")
+        await message.answer("Файл не импортирован:\n" + "\n".join(errors))
+        return
+    if not items:
+        await message.answer("В файле нет позиций")
+        return
+
+    success, result = await import_stock(items, user_id)
+
+    if success:
+        log_action(user_id, f"/import {filename}", f"успех: {result}")
+    else:
+        log_action(user_id, f"/import {filename}", f"ошибка: {result}")
+    await message.answer(result)
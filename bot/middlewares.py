@@ -0,0 +1,116 @@
+import asyncio
+import time
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from core.metrics import command_seconds, command_errors, commands_in_flight, telegram_api_seconds
+from core.profiling import command_scope
+from core.dedupe import DuplicateUpdate, current_update_id
+from core.audit import AuditError
+
+
+class ConcurrencyLimitMiddleware(BaseMiddleware):
+    """Ограничивает число одновременно обрабатываемых апдейтов и умеет дождаться их при остановке."""
+
+    def __init__(self, limit):
+        self._semaphore = asyncio.Semaphore(limit)
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self.in_flight = 0
+
+    async def __call__(self, handler, event, data):
+        # Считаем апдейт сразу, ещё до ожидания семафора, чтобы drain дождался и очередь
+        self.in_flight += 1
+        self._idle.clear()
+        try:
+            async with self._semaphore:
+                return await handler(event, data)
+        finally:
+            self.in_flight -= 1
+            if self.in_flight == 0:
+                self._idle.set()
+
+    async def drain(self, timeout):
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+def command_name(message):
+    if message.document:
+        return "document"
+    text = message.text or ""
+    if not text.startswith("/"):
+        return "other"
+    return text.split(maxsplit=1)[0].split("@", 1)[0].lower()
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """Гистограмма времени, ошибки и число выполняющихся команд по каждой команде."""
+
+    async def __call__(self, handler, event, data):
+        command = command_name(event)
+        commands_in_flight.inc(command)
+        started = time.perf_counter()
+        try:
+            with command_scope(command):
+                return await handler(event, data)
+        except Exception:
+            command_errors.inc(command)
+            raise
+        finally:
+            command_seconds.observe(time.perf_counter() - started, command)
+            commands_in_flight.dec(command)
+
+
+class IdempotencyMiddleware(BaseMiddleware):
+    """Отбрасывает повторно доставленные апдейты: сначала по кэшу update_id в памяти,
+    затем по processed_updates, если изменение уже было закоммичено (DuplicateUpdate)."""
+
+    def __init__(self, dedupe):
+        self.dedupe = dedupe
+
+    async def __call__(self, handler, event, data):
+        update = data.get("event_update")
+        if update is None:
+            return await handler(event, data)
+
+        update_id = update.update_id
+        if not self.dedupe.check(update_id):
+            return None
+
+        token = current_update_id.set(update_id)
+        try:
+            return await handler(event, data)
+        except DuplicateUpdate:
+            # Ответ на первую доставку уже ушёл, повторно не отвечаем
+            return None
+        except Exception:
+            self.dedupe.forget(update_id)
+            raise
+        finally:
+            current_update_id.reset(token)
+
+
+class AuditErrorMiddleware(BaseMiddleware):
+    """Изменение уже закоммичено, а durable-журнал записать не удалось (AuditError):
+    пользователь получает ответ об этом, а не тишину."""
+
+    async def __call__(self, handler, event, data):
+        try:
+            return await handler(event, data)
+        except AuditError as e:
+            print(f"Журнал не записан для апдейта {current_update_id.get()}: {e}")
+            await event.answer(f"Изменение сохранено, но {e}. Сообщите администратору")
+            return None
+
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+    # Время отправки ответов в Bot API (answer, answer_document и т.д.)
+    async def __call__(self, make_request, bot, method):
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        finally:
+            telegram_api_seconds.observe(time.perf_counter() - started, type(method).__name__)
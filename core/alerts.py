@@ -0,0 +1,88 @@
+import asyncio
+
+
+class LowStockAlerts:
+    """Оповещения о падении остатка ниже min_quantity.
+
+    Пересечение порога определяется по старому и новому остатку, которые функции
+    core.database уже получили из UPDATE ... RETURNING, — O(1) на запись, без обхода stock.
+    Пересечения копятся debounce секунд и уходят подписчикам одним сообщением: серия
+    списаний даёт одно оповещение, а товар, пополненный до отправки, в него не попадёт.
+    """
+
+    def __init__(self, debounce):
+        self.debounce = debounce
+        self.crossings = 0
+        self.sent = 0
+        self.errors = 0
+        # артикул -> (название, остаток, минимум) для ещё не отправленных оповещений
+        self._pending = {}
+        self._send = None
+        self._subscribers = ()
+        self._timer = None
+        self._flush_task = None
+
+    @property
+    def running(self):
+        return self._send is not None
+
+    def start(self, send, subscribers):
+        # send(user_id, text) — обычно bot.send_message
+        self._send = send
+        self._subscribers = tuple(subscribers)
+
+    async def stop(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._flush_task is not None:
+            await self._flush_task
+        await self.flush()
+        self._send = None
+
+    def observe(self, artikul, name, old, new, minimum, old_minimum=None):
+        if not self.running:
+            return
+        if not minimum or new >= minimum:
+            # Пополнили (или сняли порог) раньше, чем ушло оповещение, — сообщать уже не о чем
+            self._pending.pop(artikul, None)
+            return
+        old_minimum = minimum if old_minimum is None else old_minimum
+        if old is not None and old < old_minimum and artikul not in self._pending:
+            # Остаток был ниже порога и раньше: об этом уже сообщали
+            return
+        if artikul not in self._pending:
+            self.crossings += 1
+        self._pending[artikul] = (name, new, minimum)
+        if self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.debounce, self._schedule_flush)
+
+    def _schedule_flush(self):
+        self._timer = None
+        # Ссылка на задачу, чтобы её не собрал сборщик мусора до завершения
+        self._flush_task = asyncio.create_task(self.flush())
+
+    async def flush(self):
+        if not self._pending or self._send is None:
+            self._pending.clear()
+            return
+        pending, self._pending = self._pending, {}
+        lines = ["Заканчиваются товары:"]
+        for artikul, (name, quantity, minimum) in sorted(pending.items()):
+            lines.append(f"{artikul} - {name}: {quantity} шт. (минимум {minimum})")
+        text = "\n".join(lines)
+        for user_id in self._subscribers:
+            try:
+                await self._send(user_id, text)
+                self.sent += 1
+            except Exception as e:
+                self.errors += 1
+                print(f"Не удалось отправить оповещение {user_id}: {e}")
+
+    def stats(self):
+        return {
+            "pending": len(self._pending),
+            "crossings": self.crossings,
+            "sent": self.sent,
+            "errors": self.errors,
+        }
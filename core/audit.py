@@ -0,0 +1,127 @@
+import asyncio
+from sqlalchemy import insert
+from models.transactions import Transaction
+
+
+class AuditError(Exception):
+    """Изменение остатков закоммичено, а его строки журнала записать не удалось."""
+
+
+class AuditWriter:
+    """Group-commit для журнала transactions.
+
+    Строки копятся в ограниченной очереди и пишутся одной многострочной вставкой,
+    как только набралось batch_size строк или прошло flush_interval секунд.
+    Неудачная вставка повторяется retries раз с удвоением паузы; если журнал так и не
+    записан, durable-вызовы получают AuditError, а строки остальных считаются потерянными.
+    """
+
+    def __init__(self, session_factory, batch_size, flush_interval, queue_size, retries=5, retry_delay=0.1):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.flushes = 0
+        self.rows_written = 0
+        self.errors = 0
+        self.retried = 0
+        self.rows_lost = 0
+        self._queue = None
+        self._task = None
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Стоп-маркер встаёт в очередь последним, поэтому всё, что было до него, будет записано
+        if not self.running:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    async def submit(self, rows, durable=False):
+        # Полная очередь даёт обратное давление: вызывающий ждёт свободного места
+        future = asyncio.get_running_loop().create_future() if durable else None
+        await self._queue.put((rows, future))
+        if future is not None:
+            await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            pending = len(item[0])
+            deadline = loop.time() + self.flush_interval
+
+            while pending < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+                pending += len(item[0])
+
+            await self._flush(batch)
+
+    async def _write(self, rows):
+        async with self.session_factory() as session:
+            await session.execute(insert(Transaction), rows)
+            await session.commit()
+
+    async def _flush(self, batch):
+        rows = [row for rows, _ in batch for row in rows]
+        delay = self.retry_delay
+        for attempt in range(self.retries + 1):
+            try:
+                await self._write(rows)
+                break
+            except Exception as e:
+                self.errors += 1
+                if attempt == self.retries:
+                    print(f"Журнал не записан после {attempt + 1} попыток, строк: {len(rows)}: {e}")
+                    error = AuditError(f"журнал операций не записан: {e}")
+                    for entry_rows, future in batch:
+                        if future is None:
+                            self.rows_lost += len(entry_rows)
+                        elif not future.done():
+                            future.set_exception(error)
+                    return
+                # Вставка откатилась целиком, поэтому повтор не задвоит строки
+                print(f"Ошибка записи журнала, повтор через {delay:.1f} с: {e}")
+                self.retried += 1
+                await asyncio.sleep(delay)
+                delay *= 2
+
+        self.flushes += 1
+        self.rows_written += len(rows)
+        for _, future in batch:
+            if future is not None and not future.done():
+                future.set_result(None)
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "errors": self.errors,
+            "retried": self.retried,
+            "rows_lost": self.rows_lost,
+        }
@@ -0,0 +1,63 @@
+from collections import OrderedDict
+
+
+class StockCache:
+    """LRU-кэш строк Stock по артикулу с write-through обновлением из core.database."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # True, пока в кэше лежит вся таблица: тогда промах означает «товара нет»
+        self.complete = False
+        self._items = OrderedDict()
+
+    def __contains__(self, artikul):
+        return artikul in self._items
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0
+
+    def get(self, artikul):
+        """Возвращает (найдено, Stock | None)."""
+        item = self._items.get(artikul)
+        if item is not None:
+            self._items.move_to_end(artikul)
+            self.hits += 1
+            return True, item
+        if self.complete:
+            self.hits += 1
+            return True, None
+        self.misses += 1
+        return False, None
+
+    def put(self, item):
+        if not self.enabled:
+            return
+        self._items[item.artikul] = item
+        self._items.move_to_end(item.artikul)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+            self.evictions += 1
+            self.complete = False
+
+    def discard(self, artikul):
+        self._items.pop(artikul, None)
+
+    def clear(self):
+        self._items.clear()
+        self.complete = False
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._items),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "complete": self.complete,
+        }
@@ -1,141 +1,785 @@
+import asyncio
+import gzip
+import os
+import time
 from contextlib import asynccontextmanager
-from sqlalchemy import select, func
+from pathlib import Path
+from datetime import datetime, timedelta, date
+from sqlalchemy import select, func, update, insert, case, text, or_, inspect, literal
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError, DBAPIError, TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from models.stock import Stock, Base
 from core.config import PG_URL
+from core.settings import (
+    DATABASE_URL, REPLICA_URL, READ_YOUR_WRITES_SECONDS, ARTIKUL_ADVISORY_LOCKS, STOCK_CACHE_SIZE, MULTI_WORKER, HISTORY_BATCH_SIZE, FIND_LIMIT,
+    AUDIT_DURABLE, AUDIT_BATCH_SIZE, AUDIT_FLUSH_MS, AUDIT_QUEUE_SIZE, AUDIT_RETRIES, AUDIT_RETRY_MS, SQL_PROFILING, SEED_TEST_DATA,
+    PARTITION_MONTHS_AHEAD, HISTORY_RETENTION_MONTHS, ARCHIVE_DIR, SNAPSHOT_RETENTION_DAYS,
+    DEDUPE_CACHE_SIZE, DEDUPE_TTL_SECONDS, PROCESSED_UPDATES_DAYS, LOW_STOCK_DEBOUNCE_SECONDS, LOW_LIMIT,
+)
+from core.cache import StockCache
+from core.locks import KeyedLocks
+from core.alerts import LowStockAlerts
+from core.dedupe import UpdateDedupe, DuplicateUpdate, current_update_id
+from core.search import NgramIndex
+from core.engine import engine_settings, engine_options, PoolMetrics, attach_sqlite_pragmas
+from core.audit import AuditWriter
+from core.metrics import registry, db_timed, Histogram, Counter
+from core import profiling, partitions
 from models.transactions import Transaction
+from models.snapshot import SnapshotRun, StockSnapshot
+from models.processed_update import ProcessedUpdate
 
 
-engine = create_async_engine(PG_URL, echo=True)
+engine_config = engine_settings()
+DB_URL = DATABASE_URL or PG_URL
+engine = create_async_engine(DB_URL, **engine_options(DB_URL))
+pool_metrics = PoolMetrics(engine_config["pool_size"] + engine_config["max_overflow"])
+pool_metrics.attach(engine.sync_engine)
+if engine.dialect.name == "sqlite":
+    attach_sqlite_pragmas(engine.sync_engine)
+if SQL_PROFILING:
+    profiling.enable(engine.sync_engine)
 SessionLocal = sessionmaker(
     engine,
     class_=AsyncSession,
     expire_on_commit=False
     )
 
+# Необязательная реплика: чтения без требования свежести уходят на неё и не конкурируют
+# с /add и /remove за основную базу
+replica_engine = create_async_engine(REPLICA_URL, **engine_options(REPLICA_URL)) if REPLICA_URL else None
+ReplicaSessionLocal = None
+if replica_engine is not None:
+    if replica_engine.dialect.name == "sqlite":
+        attach_sqlite_pragmas(replica_engine.sync_engine)
+    if SQL_PROFILING:
+        profiling.profiler.attach(replica_engine.sync_engine)
+    ReplicaSessionLocal = sessionmaker(replica_engine, class_=AsyncSession, expire_on_commit=False)
+db_reads = registry.register(Counter("db_reads_total", "Чтения по базе: replica, primary, fallback", ("target",)))
+# user_id -> момент (time.monotonic), до которого его чтения идут на основную базу
+_recent_writers = {}
+
+# Кэш и индекс в памяти обновляются только записями своего процесса: при нескольких воркерах
+# соседний процесс видел бы устаревшие остатки и «не находил» созданные не им товары
+stock_cache = StockCache(0 if MULTI_WORKER else STOCK_CACHE_SIZE)
+# В Postgres /find работает через pg_trgm, для остальных БД — триграммный индекс в памяти
+# (при нескольких воркерах — поиск подстроки запросом к БД)
+search_index = NgramIndex() if engine.dialect.name != "postgresql" and not MULTI_WORKER else None
+
+registry.add_collector("stock_cache", stock_cache.stats)
+registry.add_collector("db_pool", lambda: pool_metrics.stats())
+artikul_locks = KeyedLocks()
+registry.add_collector("artikul_locks", artikul_locks.stats)
+update_dedupe = UpdateDedupe(DEDUPE_CACHE_SIZE, DEDUPE_TTL_SECONDS)
+registry.add_collector("update_dedupe", update_dedupe.stats)
+low_stock = LowStockAlerts(LOW_STOCK_DEBOUNCE_SECONDS)
+registry.add_collector("low_stock", low_stock.stats)
+
+# Счётчик записей этого процесса: версия данных для кэша отчётов не должна отставать,
+# пока строки журнала ждут group-commit
+_local_writes = 0
+
 @asynccontextmanager
 async def get_session():
     async with SessionLocal() as session:
+        # Берём соединение сразу, чтобы измерить ожидание свободного слота в пуле
+        started = time.perf_counter()
+        await session.connection()
+        pool_metrics.observe_wait(started)
+        yield session
+
+
+# SQLite допускает одного писателя на файл: без очереди параллельные транзакции упираются
+# в «database is locked». asyncio.Lock выдаёт доступ по порядку (FIFO), поэтому записи
+# процесса идут одна за другой, а чтения в WAL идут параллельно. В Postgres очередь не нужна
+_write_lock = asyncio.Lock() if engine.dialect.name == "sqlite" else None
+write_lock_wait = registry.register(Histogram("db_write_lock_wait_seconds", "Ожидание очереди записи SQLite"))
+
+
+@asynccontextmanager
+async def write_lock():
+    if _write_lock is None:
+        yield
+        return
+    started = time.perf_counter()
+    async with _write_lock:
+        write_lock_wait.observe(time.perf_counter() - started)
+        yield
+
+
+@asynccontextmanager
+async def write_session():
+    # Сессия для изменений данных. Журнал group-commit пишется через ту же очередь:
+    # durable-вызовы ждут его уже после выхода из write_session (см. _after_commit)
+    async with write_lock():
+        async with get_session() as session:
+            yield session
+
+
+audit_writer = AuditWriter(
+    write_session, AUDIT_BATCH_SIZE, AUDIT_FLUSH_MS / 1000, AUDIT_QUEUE_SIZE, AUDIT_RETRIES, AUDIT_RETRY_MS / 1000
+)
+registry.add_collector("audit_writer", audit_writer.stats)
+
+
+advisory_lock_wait = registry.register(Histogram("db_advisory_lock_seconds", "Ожидание advisory-блокировок артикулов"))
+_use_advisory_locks = ARTIKUL_ADVISORY_LOCKS and engine.dialect.name == "postgresql"
+
+# Блокировки по хэшу артикула одним запросом; сортировка по хэшу — единый порядок для всех
+# процессов, иначе две пачки с общими артикулами могли бы взаимно заблокироваться.
+# Функция в списке выборки вычисляется уже после ORDER BY
+ADVISORY_LOCK_SQL = text(
+    "SELECT pg_advisory_xact_lock(h) FROM "
+    "(SELECT DISTINCT hashtext(k) AS h FROM unnest(CAST(:keys AS text[])) AS k) s ORDER BY h"
+)
+
+
+@asynccontextmanager
+async def mutation_session(artikuls):
+    # Изменения одного артикула выполняются по очереди, разных — параллельно: в процессе
+    # через замки по ключу, между воркерами — через pg_advisory_xact_lock, который
+    # отпускается вместе с транзакцией. Повтор уже применённого апдейта — DuplicateUpdate
+    keys = sorted(set(artikuls))
+    async with artikul_locks.hold(keys):
+        async with write_session() as session:
+            if _use_advisory_locks and keys:
+                started = time.perf_counter()
+                await session.execute(ADVISORY_LOCK_SQL, {"keys": keys})
+                advisory_lock_wait.observe(time.perf_counter() - started)
+            await _claim_update(session)
+            yield session
+
+
+async def _claim_update(session):
+    # update_id фиксируется в той же транзакции, что и изменение: повторная доставка
+    # апдейта (в другом воркере или после рестарта) упрётся в первичный ключ.
+    # Если изменение откатится, откатится и отметка — повтор сможет пройти
+    update_id = current_update_id.get()
+    if update_id is None:
+        return
+    result = await session.execute(
+        _insert(ProcessedUpdate)
+        .values(update_id=update_id)
+        .on_conflict_do_nothing()
+        .returning(ProcessedUpdate.update_id)
+    )
+    if result.scalar_one_or_none() is None:
+        await session.rollback()
+        update_dedupe.dropped_db += 1
+        raise DuplicateUpdate(update_id)
+
+
+def _note_write(user_id):
+    if replica_engine is None or user_id is None:
+        return
+    now = time.monotonic()
+    if len(_recent_writers) > 10000:
+        for key in [key for key, until in _recent_writers.items() if until <= now]:
+            del _recent_writers[key]
+    _recent_writers[user_id] = now + READ_YOUR_WRITES_SECONDS
+
+
+@asynccontextmanager
+async def read_session(user_id=None):
+    # Чтение, которому не нужна строгая свежесть: реплика, если она есть. Пользователь,
+    # только что изменивший данные, читает с основной базы, пока реплика может отставать
+    if replica_engine is None:
+        async with get_session() as session:
+            yield session
+        return
+
+    until = _recent_writers.get(user_id)
+    # _recent_writers знает только о записях этого процесса: при нескольких воркерах запись
+    # могла пройти через соседний, поэтому чтения пользователя идут на основную базу
+    # (READ_YOUR_WRITES_SECONDS=0 отдаёт их реплике ценой возможного отставания)
+    fresh = MULTI_WORKER and user_id is not None and READ_YOUR_WRITES_SECONDS > 0
+    if fresh or (until is not None and until > time.monotonic()):
+        db_reads.inc("primary")
+        async with get_session() as session:
+            yield session
+        return
+
+    session = ReplicaSessionLocal()
+    try:
+        await session.connection()
+    except (DBAPIError, PoolTimeoutError, OSError) as e:
+        # Реплика недоступна — бот продолжает работать на основной базе
+        await session.close()
+        db_reads.inc("fallback")
+        print(f"Реплика недоступна, читаем с основной базы: {e}")
+        async with get_session() as session:
+            yield session
+        return
+
+    db_reads.inc("replica")
+    try:
         yield session
+    finally:
+        await session.close()
+
+
+def _from_replica(session):
+    return replica_engine is not None and session.bind is replica_engine
+
+
+def pool_stats():
+    return pool_metrics.stats()
+
+
+ALEMBIC_INI = Path(__file__).resolve().parent.parent / "alembic.ini"
+
+
+def _prepare_schema(conn):
+    # alembic нужен только здесь, поэтому импортируем его при старте, а не на уровне модуля
+    from alembic.config import Config
+    from alembic.runtime.migration import MigrationContext
+    from alembic.script import ScriptDirectory
+
+    script = ScriptDirectory.from_config(Config(str(ALEMBIC_INI)))
+    head = script.get_current_head()
+    context = MigrationContext.configure(conn)
+    current = context.get_current_revision()
+
+    if current == head:
+        return "актуальна"
+
+    if current is None and not inspect(conn).has_table(Stock.__tablename__):
+        # Пустая база: создаём схему целиком и сразу помечаем её последней ревизией
+        Base.metadata.create_all(conn)
+        if conn.dialect.name == "postgresql":
+            partitions.partition_transactions(conn, date.today(), PARTITION_MONTHS_AHEAD)
+        context.stamp(script, head)
+        return "создана"
+
+    raise RuntimeError(
+        f"Схема БД на ревизии {current}, а код ждёт {head}: выполните `alembic upgrade head`"
+        + ("" if current else " (для базы без alembic_version сначала `alembic stamp ec0f0f66a236`)")
+    )
+
+
+# PRAGMA user_version файла SQLite, с которой индексы по lower() построены юникодным lower
+SQLITE_LOWER_VERSION = 1
+
+
+def _reindex_sqlite_lower(conn):
+    # Индекс ux_stock_name_lower, построенный встроенным ASCII-lower (старые базы, alembic),
+    # расходится с юникодным lower соединений бота — перестраиваем его один раз
+    if conn.exec_driver_sql("PRAGMA user_version").scalar() >= SQLITE_LOWER_VERSION:
+        return
+    duplicates = conn.execute(text(
+        "SELECT lower(name), count(*) FROM stock GROUP BY lower(name) HAVING count(*) > 1"
+    )).all()
+    if duplicates:
+        names = ", ".join(f"{name} ({count})" for name, count in duplicates)
+        raise RuntimeError(f"В stock есть одинаковые без учёта регистра названия, переименуйте их: {names}")
+    conn.exec_driver_sql("REINDEX ux_stock_name_lower")
+    conn.exec_driver_sql(f"PRAGMA user_version = {SQLITE_LOWER_VERSION}")
+    print("Индекс ux_stock_name_lower перестроен с юникодным lower()")
 
 
 async def init_db():
+    # Вместо create_all на каждом старте — сверка ревизии alembic; таблица stock
+    # не читается целиком, для сида достаточно проверить, есть ли хоть одна строка
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+        state = await conn.run_sync(_prepare_schema)
+        if engine.dialect.name == "sqlite":
+            await conn.run_sync(_reindex_sqlite_lower)
+    print(f"Схема БД {state}")
 
-    async with get_session() as session:
-        result = await session.execute(select(Stock))
-        rows = result.scalars().all()
-        
-        if len(rows) == 0:
-            test_data = [
-                Stock(artikul='A-001', name='Мышь', quantity=10),
-                Stock(artikul='A-002', name='Клавиатура', quantity=5),
-                Stock(artikul='A-003', name='Монитор', quantity=2),
-            ]
-            session.add_all(test_data)
-            await session.commit()
-            print("Добавлены тестовые данные")
-        else:
-            print(f"В базе уже есть {len(rows)} товаров")
+    if SEED_TEST_DATA:
+        async with get_session() as session:
+            result = await session.execute(select(select(Stock.artikul).exists()))
+            if not result.scalar():
+                test_data = [
+                    Stock(artikul='A-001', name='Мышь', quantity=10),
+                    Stock(artikul='A-002', name='Клавиатура', quantity=5),
+                    Stock(artikul='A-003', name='Монитор', quantity=2),
+                ]
+                session.add_all(test_data)
+                await session.commit()
+                print("Добавлены тестовые данные")
 
+    # Кэш остатков и индекс /find прогреваются в фоне: старт не зависит от размера каталога,
+    # а до конца прогрева /stock читает из БД, а /find ищет подстроку запросом
+    global _warm_task
+    if _warm_task is None and (stock_cache.enabled or search_index is not None):
+        _warm_task = asyncio.create_task(warm_caches())
 
-async def log_transaction(artikul, type, user_id, quantity=None, old_quantity=None, new_quantity=None, details=None):
-    
-    async with get_session() as session:
-        transaction = Transaction(
-            artikul = artikul,
-            type = type,
-            quantity = quantity,
-            old_quantity = old_quantity,
-            new_quantity = new_quantity,
-            user_id = user_id,
-            details = details,
+
+# Фоновый прогрев: задача и артикулы, изменённые этим процессом, пока он идёт
+_warm_task = None
+_warming = None
+_search_ready = False
+
+
+@db_timed
+async def warm_caches():
+    # Строки читаются потоково пачками; артикулы, которые процесс успел изменить или
+    # прочитать сам, пропускаются — их значение в кэше новее прочитанного снимка
+    global _warming, _search_ready
+    _warming = set()
+    loaded = 0
+    evictions = stock_cache.evictions
+    try:
+        async with get_session() as session:
+            result = await session.stream(
+                select(Stock.artikul, Stock.name, Stock.quantity).execution_options(yield_per=HISTORY_BATCH_SIZE)
+            )
+            async for rows in result.partitions():
+                for artikul, name, quantity in rows:
+                    loaded += 1
+                    if artikul in _warming:
+                        continue
+                    if search_index is not None:
+                        search_index.add(artikul, name)
+                    if loaded <= stock_cache.maxsize and artikul not in stock_cache:
+                        stock_cache.put(Stock(artikul=artikul, name=name, quantity=quantity))
+        # Промах по полному кэшу означает «товара нет» — только если поместилась вся таблица
+        stock_cache.complete = (
+            stock_cache.enabled and loaded <= stock_cache.maxsize and stock_cache.evictions == evictions
         )
+        _search_ready = True
+    except Exception as e:
+        print(f"Ошибка прогрева кэша: {e}")
+    finally:
+        _warming = None
 
-        session.add(transaction)
-        await session.commit()
 
+# Версии записей по артикулам: get_item кладёт прочитанную строку в кэш, только если
+# за время его SELECT этот артикул никто не менял, иначе строка старее записанной
+_cache_version = 0
+_cache_written = {}
 
-async def get_item(artikul):
-    async with get_session() as session:
+
+def _note_cache_write(artikul):
+    global _cache_version
+    _cache_version += 1
+    _cache_written[artikul] = _cache_version
+
+
+def _cache_put(artikul, name, quantity):
+    _note_cache_write(artikul)
+    stock_cache.put(Stock(artikul=artikul, name=name, quantity=quantity))
+    if search_index is not None:
+        search_index.add(artikul, name)
+    if _warming is not None:
+        _warming.add(artikul)
+
+
+def _cache_discard(artikul):
+    _note_cache_write(artikul)
+    stock_cache.discard(artikul)
+    if search_index is not None:
+        search_index.remove(artikul)
+    if _warming is not None:
+        _warming.add(artikul)
+
+
+async def _write_audit(session, rows):
+    update_id = current_update_id.get()
+    for row in rows:
+        row["update_id"] = update_id
+    # Без group-commit журнал пишется в той же транзакции, что и изменение остатка
+    if not audit_writer.running:
+        await session.execute(insert(Transaction), rows)
+
+
+async def _after_commit(rows, user_id):
+    # Вызывается после выхода из mutation_session: ожидание durable-записи журнала не держит
+    # ни очередь записи SQLite, ни замок артикула, ни соединение из пула, и group-commit
+    # успевает собрать строки параллельных изменений в одну вставку
+    global _local_writes
+    _local_writes += 1
+    _note_write(user_id)
+    if audit_writer.running and rows:
+        # Остаток уже закоммичен. Если журнал не записался и после повторов, durable-вызов
+        # получает AuditError: сообщить «готово» при потерянном журнале нельзя
+        await audit_writer.submit(rows, durable=AUDIT_DURABLE)
+
+
+@db_timed
+async def log_transaction(artikul, type, user_id, quantity=None, old_quantity=None, new_quantity=None, details=None):
+    row = {
+        "artikul": artikul,
+        "type": type,
+        "quantity": quantity,
+        "old_quantity": old_quantity,
+        "new_quantity": new_quantity,
+        "user_id": user_id,
+        "details": details,
+        "update_id": current_update_id.get(),
+    }
+
+    if not audit_writer.running:
+        async with write_session() as session:
+            await _write_audit(session, [row])
+            await session.commit()
+    await _after_commit([row], user_id)
+
+
+@db_timed
+async def get_item(artikul, user_id=None):
+    if stock_cache.enabled:
+        found, item = stock_cache.get(artikul)
+        if found:
+            return (item.name, item.quantity) if item else None
+
+    version = _cache_version
+    async with read_session(user_id) as session:
         result = await session.execute(
                 select(Stock).where(Stock.artikul == artikul)
                 )
         item = result.scalar_one_or_none()
+        # Строка с отстающей реплики не должна надолго застрять в кэше, а строка, которую
+        # успел изменить писатель (его _cache_put уже прошёл), — перезаписать более новую
+        if item and not _from_replica(session) and _cache_written.get(artikul, 0) <= version:
+            stock_cache.put(item)
         return (item.name, item.quantity) if item else None
 
 
-async def add_quantity(artikul, quantity, user_id):
-    async with get_session() as session:
-        try:
-            result = await session.execute(select(Stock).where(Stock.artikul == artikul))
-            item = result.scalar_one()
+def _add_statement(artikul, quantity):
+    # Остаток меняется в самой БД, а не пишется вычисленным в Python: параллельные
+    # изменения не теряются, даже если их не упорядочили замки процесса
+    return (
+        update(Stock)
+        .where(Stock.artikul == artikul)
+        .values(quantity=Stock.quantity + quantity)
+        .returning(Stock.name, Stock.quantity, Stock.min_quantity)
+    )
 
-            if item:
-                old_qty = item.quantity
-                item.quantity += quantity
 
-            await session.commit()
+def _remove_statement(artikul, quantity):
+    # Условие quantity >= :quantity проверяется в самой БД, поэтому параллельные
+    # списания не могут увести остаток в минус; нет строки — списание отклонено
+    return (
+        update(Stock)
+        .where(Stock.artikul == artikul, Stock.quantity >= quantity)
+        .values(quantity=Stock.quantity - quantity)
+        .returning(Stock.name, Stock.quantity, Stock.min_quantity)
+    )
 
-            
-            await log_transaction(
-                artikul = artikul,
-                type = 'add',
-                quantity = quantity,
-                old_quantity = old_qty,
-                new_quantity = item.quantity,
-                user_id = user_id
-                )
 
+@db_timed
+async def add_quantity(artikul, quantity, user_id):
+    # Одна транзакция: UPDATE ... RETURNING + запись в журнал, без предварительного SELECT
+    async with mutation_session([artikul]) as session:
+        try:
+            result = await session.execute(_add_statement(artikul, quantity))
+            row = result.one_or_none()
+            if row is None:
+                await session.rollback()
+                return None
 
-            return (item.name, item.quantity)
+            name, new_qty, min_qty = row
+            audit = [{
+                "artikul": artikul,
+                "type": 'add',
+                "quantity": quantity,
+                "old_quantity": new_qty - quantity,
+                "new_quantity": new_qty,
+                "user_id": user_id,
+            }]
+            await _write_audit(session, audit)
+            await session.commit()
+            _cache_put(artikul, name, new_qty)
+            low_stock.observe(artikul, name, new_qty - quantity, new_qty, min_qty)
         except Exception as e:
             await session.rollback()
             print(f"Ошибка: {e}")
             return None
+    await _after_commit(audit, user_id)
+    return (name, new_qty)
 
 
+@db_timed
 async def remove_quantity(artikul, quantity, user_id):
-    async with get_session() as session:
+    async with mutation_session([artikul]) as session:
         try:
-            result = await session.execute(select(Stock).where(Stock.artikul == artikul))
-            item = result.scalar_one_or_none()
+            result = await session.execute(_remove_statement(artikul, quantity))
+            row = result.one_or_none()
 
-            if not item:
-                return False, "Товар не найден"
-            if item.quantity < quantity:
-                return False, f"Недостаточно. Доступно: {item.quantity}"
-            old_qty = item.quantity
-            item.quantity -= quantity
+            if row is None:
+                # Медленный путь только для ошибки: выясняем причину отказа
+                result = await session.execute(select(Stock.quantity).where(Stock.artikul == artikul))
+                available = result.scalar_one_or_none()
+                await session.rollback()
+                if available is None:
+                    return False, "Товар не найден"
+                return False, f"Недостаточно. Доступно: {available}"
+
+            name, new_qty, min_qty = row
+            audit = [{
+                "artikul": artikul,
+                "type": 'remove',
+                "quantity": quantity,
+                "old_quantity": new_qty + quantity,
+                "new_quantity": new_qty,
+                "user_id": user_id,
+            }]
+            await _write_audit(session, audit)
             await session.commit()
+            _cache_put(artikul, name, new_qty)
+            low_stock.observe(artikul, name, new_qty + quantity, new_qty, min_qty)
+        except Exception as e:
+            await session.rollback()
+            return False, f"Ошибка: {e}"
+    await _after_commit(audit, user_id)
+    return True, f"Списано {quantity}. Остаток {new_qty}"
 
-            await log_transaction(
-                artikul = artikul,
-                type = 'remove',
-                quantity = quantity,
-                old_quantity = old_qty,
-                new_quantity = item.quantity,
-                user_id = user_id
+
+async def _apply_batch(items, user_id, type, sign):
+    # items: {артикул: количество}; одна транзакция, один UPDATE на всю пачку
+    # и одна многострочная вставка в журнал
+    async with mutation_session(items) as session:
+        try:
+            delta = case(items, value=Stock.artikul)
+            stmt = update(Stock).where(Stock.artikul.in_(list(items)))
+            if sign < 0:
+                stmt = stmt.where(Stock.quantity >= delta)
+            result = await session.execute(
+                stmt
+                .values(quantity=Stock.quantity + sign * delta)
+                .returning(Stock.artikul, Stock.name, Stock.quantity, Stock.min_quantity)
+                .execution_options(synchronize_session=False)
+            )
+            rows = result.all()
+
+            if len(rows) != len(items):
+                # Пачка применяется целиком или никак: собираем причины отказа
+                result = await session.execute(
+                    select(Stock.artikul, Stock.quantity).where(Stock.artikul.in_(list(items)))
                 )
-            
-            return True, f"Списано {quantity}. Остаток {item.quantity}"
+                available = dict(result.all())
+                await session.rollback()
+                errors = []
+                for artikul, quantity in items.items():
+                    if artikul not in available:
+                        errors.append(f"{artikul}: товар не найден")
+                    elif sign < 0 and available[artikul] < quantity:
+                        errors.append(f"{artikul}: недостаточно, доступно {available[artikul]}")
+                return False, errors
+
+            changes = [(artikul, name, new_qty - sign * items[artikul], new_qty) for artikul, name, new_qty, _ in rows]
+            minimums = {artikul: min_qty for artikul, _, _, min_qty in rows}
+            audit = [
+                {
+                    "artikul": artikul,
+                    "type": type,
+                    "quantity": items[artikul],
+                    "old_quantity": old_qty,
+                    "new_quantity": new_qty,
+                    "user_id": user_id,
+                }
+                for artikul, name, old_qty, new_qty in changes
+            ]
+            await _write_audit(session, audit)
+            await session.commit()
+
+            for artikul, name, old_qty, new_qty in changes:
+                _cache_put(artikul, name, new_qty)
+                low_stock.observe(artikul, name, old_qty, new_qty, minimums[artikul])
         except Exception as e:
             await session.rollback()
-            return False, f"Ошибка: {e}"
+            return False, [f"Ошибка: {e}"]
+    await _after_commit(audit, user_id)
+    return True, changes
+
+
+@db_timed
+async def add_quantities(items, user_id):
+    return await _apply_batch(items, user_id, 'add', 1)
+
+
+@db_timed
+async def remove_quantities(items, user_id):
+    return await _apply_batch(items, user_id, 'remove', -1)
+
+
+@db_timed
+async def import_stock(items, user_id):
+    # items: {артикул: (название, количество)}. Данные заливаются во временную таблицу
+    # (COPY для Postgres), затем журнал и остатки обновляются двумя set-based запросами
+    async with mutation_session(()) as session:
+        try:
+            conn = await session.connection()
+            postgres = conn.dialect.name == "postgresql"
+
+            if not postgres:
+                await session.execute(text("DROP TABLE IF EXISTS stock_import"))
+            await session.execute(text(
+                "CREATE TEMP TABLE stock_import "
+                "(artikul VARCHAR PRIMARY KEY, name VARCHAR NOT NULL, quantity INTEGER NOT NULL)"
+                + (" ON COMMIT DROP" if postgres else "")
+            ))
+
+            records = [(artikul, name, quantity) for artikul, (name, quantity) in items.items()]
+            if postgres:
+                raw = await conn.get_raw_connection()
+                await raw.driver_connection.copy_records_to_table(
+                    "stock_import", records=records, columns=["artikul", "name", "quantity"]
+                )
+            else:
+                await session.execute(
+                    text("INSERT INTO stock_import (artikul, name, quantity) VALUES (:artikul, :name, :quantity)"),
+                    [{"artikul": a, "name": n, "quantity": q} for a, n, q in records],
+                )
+
+            # Уникальный индекс по lower(name): название не может принадлежать другому артикулу
+            result = await session.execute(text(
+                "SELECT i.artikul, i.name, s.artikul FROM stock_import i "
+                "JOIN stock s ON lower(s.name) = lower(i.name) AND s.artikul <> i.artikul LIMIT 20"
+            ))
+            clashes = result.all()
+            if clashes:
+                await session.rollback()
+                return False, "Файл не импортирован, названия уже заняты:\n" + "\n".join(
+                    f"{artikul} «{name}» — занято артикулом {other}" for artikul, name, other in clashes
+                )
+
+            # Журнал пишем до upsert, пока в stock ещё старые значения; неизменённые позиции пропускаем
+            result = await session.execute(text(
+                "INSERT INTO transactions (artikul, type, quantity, old_quantity, new_quantity, user_id, details, update_id) "
+                "SELECT i.artikul, 'import', i.quantity - COALESCE(s.quantity, 0), s.quantity, i.quantity, :user_id, i.name, :update_id "
+                "FROM stock_import i LEFT JOIN stock s ON s.artikul = i.artikul "
+                "WHERE s.artikul IS NULL OR s.quantity <> i.quantity OR s.name <> i.name"
+            ), {"user_id": user_id, "update_id": current_update_id.get()})
+            changed = result.rowcount
+
+            # Пересечения порога min_quantity — по тем же старым и новым остаткам, что и журнал
+            crossings = []
+            if low_stock.running:
+                result = await session.execute(text(
+                    "SELECT i.artikul, i.name, s.quantity, i.quantity, s.min_quantity "
+                    "FROM stock_import i JOIN stock s ON s.artikul = i.artikul "
+                    "WHERE s.min_quantity > 0 AND i.quantity <> s.quantity "
+                    "AND (i.quantity < s.min_quantity OR s.quantity < s.min_quantity)"
+                ))
+                crossings = result.all()
+
+            # WHERE true нужен SQLite, чтобы отличить ON CONFLICT от синтаксиса JOIN
+            await session.execute(text(
+                "INSERT INTO stock (artikul, name, quantity) "
+                "SELECT artikul, name, quantity FROM stock_import WHERE true "
+                "ON CONFLICT (artikul) DO UPDATE SET name = excluded.name, quantity = excluded.quantity"
+            ))
+
+            if not postgres:
+                await session.execute(text("DROP TABLE stock_import"))
+            await session.commit()
+
+            for artikul, name, quantity in records:
+                _cache_put(artikul, name, quantity)
+            for artikul, name, old_qty, new_qty, min_qty in crossings:
+                low_stock.observe(artikul, name, old_qty, new_qty, min_qty)
+        except Exception as e:
+            await session.rollback()
+            return False, f"Ошибка импорта: {e}"
+    # журнал импорта уже записан в этой транзакции
+    await _after_commit([], user_id)
+    return True, f"Импортировано позиций: {len(records)}, изменено: {changed}"
+
+
+@db_timed
+async def find_items(query, limit=FIND_LIMIT):
+    if search_index is not None and _search_ready:
+        matches = search_index.search(query, limit)
+        if not matches:
+            return []
+        async with get_session() as session:
+            result = await session.execute(
+                select(Stock.artikul, Stock.quantity).where(Stock.artikul.in_([artikul for artikul, _, _ in matches]))
+            )
+            quantities = dict(result.all())
+        return [(artikul, name, quantities[artikul]) for artikul, name, _ in matches if artikul in quantities]
 
+    pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    if engine.dialect.name != "postgresql":
+        # Индекса в памяти нет (несколько воркеров) или он ещё прогревается:
+        # подстрока названия без учёта регистра
+        async with get_session() as session:
+            result = await session.execute(
+                select(Stock.artikul, Stock.name, Stock.quantity)
+                .where(func.lower(Stock.name).like(pattern.lower(), escape="\\"))
+                .order_by(func.length(Stock.name), Stock.artikul)
+                .limit(limit)
+            )
+            return [tuple(row) for row in result.all()]
 
-async def get_all_stock():
+    # word_similarity и оператор <% обслуживаются GIN-индексом ix_stock_name_trgm;
+    # ILIKE ловит короткие подстроки, для которых триграмм слишком мало
+    score = func.word_similarity(query, Stock.name)
     async with get_session() as session:
+        result = await session.execute(
+            select(Stock.artikul, Stock.name, Stock.quantity)
+            .where(or_(Stock.name.bool_op("%>")(query), Stock.name.ilike(pattern)))
+            .order_by(score.desc(), func.length(Stock.name), Stock.artikul)
+            .limit(limit)
+        )
+        return [tuple(row) for row in result.all()]
+
+
+@db_timed
+async def get_all_stock(user_id=None):
+    async with read_session(user_id) as session:
         result = await session.execute(select(Stock).order_by(Stock.artikul))
         items = result.scalars().all()
         return[(item.artikul, item.name, item.quantity) for item in items]
         
 
 
+@db_timed
+async def set_min_quantity(artikul, minimum, user_id):
+    async with mutation_session([artikul]) as session:
+        try:
+            # Строка уже защищена блокировкой артикула, поэтому старый порог можно прочитать отдельно
+            result = await session.execute(
+                select(Stock.name, Stock.quantity, Stock.min_quantity).where(Stock.artikul == artikul)
+            )
+            row = result.one_or_none()
+            if row is None:
+                await session.rollback()
+                return False, "Товар не найден"
+
+            name, quantity, old_minimum = row
+            await session.execute(update(Stock).where(Stock.artikul == artikul).values(min_quantity=minimum))
+            audit = [{
+                "artikul": artikul,
+                "type": 'min_quantity',
+                "user_id": user_id,
+                "details": f"Минимальный остаток {old_minimum} → {minimum}",
+            }]
+            await _write_audit(session, audit)
+            await session.commit()
+            low_stock.observe(artikul, name, quantity, quantity, minimum, old_minimum)
+        except Exception as e:
+            await session.rollback()
+            return False, f"Ошибка: {e}"
+    await _after_commit(audit, user_id)
+
+    if minimum and quantity < minimum:
+        return True, f"Минимум для {artikul} - {name}: {minimum} шт. Сейчас меньше: {quantity} шт."
+    return True, f"Минимум для {artikul} - {name}: {minimum} шт." if minimum else f"Порог для {artikul} снят"
+
+
+@db_timed
+async def get_low_stock(limit=LOW_LIMIT, user_id=None):
+    # Условие совпадает с предикатом частичного индекса ix_stock_low: читаются только
+    # товары ниже порога, а не вся таблица stock
+    async with read_session(user_id) as session:
+        result = await session.execute(
+            select(Stock.artikul, Stock.name, Stock.quantity, Stock.min_quantity)
+            .where(Stock.quantity < Stock.min_quantity)
+            .order_by(Stock.artikul)
+            .limit(limit + 1)
+        )
+        return [tuple(row) for row in result.all()]
+
+
+@db_timed
 async def rename_item(artikul, new_name, user_id):
-    async with get_session() as session:
+    async with mutation_session([artikul]) as session:
         try:
             result = await session.execute(select(Stock).where(Stock.artikul == artikul))
             item = result.scalar_one_or_none()
@@ -145,24 +789,30 @@ async def rename_item(artikul, new_name, user_id):
             
             oldname = item.name
             item.name = new_name
-            await session.commit()
-
-            await log_transaction(
-                artikul = artikul,
-                type = 'rename',
-                user_id = user_id,
-                details= f"Товар {oldname} был переименован в {item.name}"
-                )
-
-            return True, f"Товар {artikul} переименован в '{new_name}'"
+            audit = [{
+                "artikul": artikul,
+                "type": 'rename',
+                "user_id": user_id,
+                "details": f"Товар {oldname}{RENAME_MARKER}{new_name}",
+            }]
+            try:
+                await _write_audit(session, audit)
+                await session.commit()
+            except IntegrityError:
+                await session.rollback()
+                return False, f"Товар с названием «{new_name}» уже существует"
+            _cache_put(artikul, item.name, item.quantity)
         except Exception as e:
             await session.rollback()
             return False, f"Ошибка: {e}"
+    await _after_commit(audit, user_id)
+    return True, f"Товар {artikul} переименован в '{new_name}'"
 
 
 
+@db_timed
 async def delete_item(artikul, user_id):
-    async with get_session() as session:
+    async with mutation_session([artikul]) as session:
         try:
             result = await session.execute(select(Stock).where(Stock.artikul == artikul))
             item = result.scalar_one_or_none()
@@ -172,61 +822,310 @@ async def delete_item(artikul, user_id):
             
             name = item.name
             await session.delete(item)
+            audit = [{
+                "artikul": artikul,
+                "type": 'delete',
+                "user_id": user_id,
+            }]
+            await _write_audit(session, audit)
             await session.commit()
-
-            await log_transaction(
-                artikul = artikul,
-                type = 'delete',
-                user_id = user_id,
-                )
-
-            return True, f"Товар {artikul} - {name} удален со склада"
+            _cache_discard(artikul)
         except Exception as e:
             await session.rollback()
             return False, f"Ошибка: {e}"
+    await _after_commit(audit, user_id)
+    return True, f"Товар {artikul} - {name} удален со склада"
+
 
+def _insert(table):
+    # INSERT ... ON CONFLICT есть у обоих поддерживаемых диалектов, но конструкции разные
+    if engine.dialect.name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
 
+
+@db_timed
 async def new_item(artikul, name, user_id):
-    async with get_session() as session:
+    # Счастливый путь — один INSERT ... ON CONFLICT DO NOTHING RETURNING без предварительных SELECT;
+    # гонку двух /new разрешают уникальные индексы по artikul и lower(name)
+    async with mutation_session([artikul]) as session:
         try:
-            result = await session.execute(select(Stock).where(Stock.artikul == artikul))
-            existing = result.scalar_one_or_none()
+            result = await session.execute(
+                _insert(Stock)
+                .values(artikul=artikul, name=name, quantity=0)
+                .on_conflict_do_nothing()
+                .returning(Stock.artikul)
+            )
 
-            if existing:
-                return False, f"Артикул {artikul} уже существует! Товар: {existing.name}"
-            
-            existing_by_name = await session.execute(select(Stock).where(func.lower(Stock.name) == func.lower(name)))
-            existing_by_name = existing_by_name.scalar_one_or_none()
-            if existing_by_name:
-                return False, (
-                    f"Товар с названием «{name}» уже существует!\n"
-                    f"Артикул: {existing_by_name.artikul}\n"
-                    f"Название: {existing_by_name.name}\n"
-                    f"Остаток: {existing_by_name.quantity}\n\n"
-                    f"Используйте этот артикул для добавления товара."
+            if result.scalar_one_or_none() is None:
+                # Конфликт: выясняем, какой из индексов сработал
+                # Только столбцы, а не ORM-объекты: rollback ниже пометил бы объекты устаревшими,
+                # и чтение их атрибутов вне greenlet упало бы с ошибкой
+                result = await session.execute(
+                    select(Stock.artikul, Stock.name, Stock.quantity)
+                    .where(or_(Stock.artikul == artikul, func.lower(Stock.name) == func.lower(name)))
                 )
+                existing = [tuple(row) for row in result.all()]
+                await session.rollback()
 
-            new_stock = Stock(artikul=artikul, name=name, quantity=0)
+                by_artikul = next((row for row in existing if row[0] == artikul), None)
+                if by_artikul:
+                    return False, f"Артикул {artikul} уже существует! Товар: {by_artikul[1]}"
+                if existing:
+                    other_artikul, other_name, other_quantity = existing[0]
+                    return False, (
+                        f"Товар с названием «{name}» уже существует!\n"
+                        f"Артикул: {other_artikul}\n"
+                        f"Название: {other_name}\n"
+                        f"Остаток: {other_quantity}\n\n"
+                        f"Используйте этот артикул для добавления товара."
+                    )
+                return False, "Не удалось создать товар, попробуйте ещё раз"
 
-            session.add(new_stock)
+            audit = [{
+                "artikul": artikul,
+                "type": 'new_item',
+                "user_id": user_id,
+                "details": name,
+            }]
+            await _write_audit(session, audit)
             await session.commit()
-
-            await log_transaction(
-                artikul = artikul,
-                type = 'new_item',
-                user_id = user_id,
-                details=name
-                )
-
-            return True, f"Создан новый товар: {artikul} - {name}"
+            _cache_put(artikul, name, 0)
         except Exception as e:
             await session.rollback()
             return False, f"Ошибка при создании товара: {e}"
+    await _after_commit(audit, user_id)
+    return True, f"Создан новый товар: {artikul} - {name}"
+
+@db_timed
+async def take_snapshot():
+    # Остатки и номер последней операции журнала читаются в одной транзакции;
+    # в Postgres — REPEATABLE READ, чтобы оба чтения видели один и тот же момент
+    async with write_lock(), engine.connect() as conn:
+        if conn.dialect.name == "postgresql":
+            conn = await conn.execution_options(isolation_level="REPEATABLE READ")
+        async with conn.begin():
+            result = await conn.execute(select(func.coalesce(func.max(Transaction.id), 0)))
+            last_id = result.scalar_one()
+            result = await conn.execute(
+                insert(SnapshotRun).values(last_transaction_id=last_id).returning(SnapshotRun.id, SnapshotRun.taken_at)
+            )
+            run_id, taken_at = result.one()
+            result = await conn.execute(
+                insert(StockSnapshot).from_select(
+                    ["run_id", "artikul", "name", "quantity"],
+                    select(literal(run_id), Stock.artikul, Stock.name, Stock.quantity),
+                )
+            )
+            rows = result.rowcount
+            if SNAPSHOT_RETENTION_DAYS > 0:
+                # Каждый снимок — копия всего каталога: старые удаляются, строки stock_snapshots
+                # уходят вместе с ними по ON DELETE CASCADE
+                await conn.execute(
+                    SnapshotRun.__table__.delete().where(
+                        SnapshotRun.taken_at < taken_at - timedelta(days=SNAPSHOT_RETENTION_DAYS)
+                    )
+                )
+            return taken_at, rows
+
 
-async def get_history():
+@db_timed
+async def get_last_snapshot_time():
     async with get_session() as session:
-        result = await session.execute(select(Transaction).order_by(Transaction.id))
-        items = result.scalars().all()
-        return[(item.id, item.artikul, item.type, item.quantity, item.old_quantity, item.new_quantity, item.user_id, item.details, item.timestamp) for item in items]
+        result = await session.execute(select(func.max(SnapshotRun.taken_at)))
+        return result.scalar_one()
+
+
+SNAPSHOT_REPLAY_MARGIN = timedelta(hours=1)
+RENAME_MARKER = " был переименован в "
+
+
+def _renamed_to(details, old_name):
+    # details пишет rename_item: «Товар {старое} был переименован в {новое}». Старое название
+    # известно из восстановленного состояния, поэтому отрезаем префикс целиком — названия
+    # с « в » внутри (и даже с самим маркером) не ломают разбор
+    if not details:
+        return old_name
+    prefix = f"Товар {old_name}{RENAME_MARKER}"
+    if details.startswith(prefix):
+        return details[len(prefix):]
+    return details.partition(RENAME_MARKER)[2] or old_name
+
+
+@db_timed
+async def get_item_at(artikul, day):
+    # Остаток на конец дня day: ближайший снимок до этого момента плюс только
+    # операции журнала после него — O(операций с момента снимка), а не O(всей истории)
+    until = datetime.combine(day, datetime.min.time()) + timedelta(days=1)
+    async with get_session() as session:
+        result = await session.execute(
+            select(SnapshotRun.id, SnapshotRun.taken_at)
+            .where(SnapshotRun.taken_at < until)
+            .order_by(SnapshotRun.taken_at.desc())
+            .limit(1)
+        )
+        run = result.one_or_none()
+
+        item = None
+        replay = select(Transaction.type, Transaction.quantity, Transaction.new_quantity, Transaction.details).where(
+            Transaction.artikul == artikul, Transaction.timestamp < until
+        )
+        if run:
+            run_id, taken_at = run
+            result = await session.execute(
+                select(StockSnapshot.name, StockSnapshot.quantity)
+                .where(StockSnapshot.run_id == run_id, StockSnapshot.artikul == artikul)
+            )
+            row = result.one_or_none()
+            item = tuple(row) if row else None
+            # Нижняя граница по timestamp: индекс (artikul, timestamp) читает только операции
+            # со времени снимка, а не всю историю товара, и в Postgres отсекаются старые секции.
+            # Запас на транзакции, начатые до снимка (timestamp — время их начала), а закоммиченные
+            # после. Фильтра по last_transaction_id нет: такая транзакция могла получить id меньше
+            # него и всё равно не попасть в снимок. Повтор уже учтённых операций безопасен —
+            # они выставляют абсолютный new_quantity, а блокировки по артикулу держат порядок id
+            replay = replay.where(Transaction.timestamp >= taken_at - SNAPSHOT_REPLAY_MARGIN)
+
+        result = await session.execute(replay.order_by(Transaction.id))
+        for type, quantity, new_quantity, details in result.all():
+            if type == 'delete':
+                item = None
+            elif type == 'new_item':
+                item = (details, 0)
+            elif type == 'import':
+                item = (details or (item[0] if item else artikul), new_quantity)
+            elif new_quantity is not None:
+                item = (item[0] if item else artikul, new_quantity)
+            elif type == 'rename' and item is not None:
+                item = (_renamed_to(details, item[0]), item[1])
+        return item
+
+
+async def _no_statement_timeout(conn):
+    # Перенос строк из default-секции, DETACH и COPY большой секции идут дольше, чем
+    # statement_timeout профиля prod; SET LOCAL действует только до конца транзакции
+    await conn.execute(text("SET LOCAL statement_timeout = 0"))
+
+
+async def _archive_partition(conn, name):
+    # COPY секции в gzip-CSV: сначала во временный файл, затем атомарное переименование,
+    # чтобы оборванная выгрузка не выглядела готовым архивом
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    path = os.path.join(ARCHIVE_DIR, f"{name}.csv.gz")
+    tmp = path + ".part"
+    archive = await asyncio.to_thread(gzip.open, tmp, "wb")
+    try:
+        async def write(chunk):
+            await asyncio.to_thread(archive.write, chunk)
+
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.copy_from_table(name, output=write, format="csv", header=True)
+    finally:
+        await asyncio.to_thread(archive.close)
+    os.replace(tmp, path)
+    return path
+
+
+@db_timed
+async def prune_processed_updates(days=PROCESSED_UPDATES_DAYS):
+    # Telegram повторяет доставку не дольше суток, старые отметки больше не нужны
+    async with write_session() as session:
+        result = await session.execute(
+            ProcessedUpdate.__table__.delete().where(
+                ProcessedUpdate.processed_at < datetime.now() - timedelta(days=days)
+            )
+        )
+        await session.commit()
+        return result.rowcount
+
+
+@db_timed
+async def maintain_partitions(today=None):
+    # Создаёт секции журнала на PARTITION_MONTHS_AHEAD месяцев вперёд и, если задан
+    # HISTORY_RETENTION_MONTHS, отключает секции старше срока, выгружает их в ARCHIVE_DIR и удаляет
+    # Заодно чистим отметки идемпотентности — это тоже обслуживание журнала
+    await prune_processed_updates()
+    if engine.dialect.name != "postgresql":
+        return None
+    today = today or date.today()
+
+    async with engine.begin() as conn:
+        if not await conn.run_sync(partitions.is_partitioned):
+            return None
+        await _no_statement_timeout(conn)
+        created = await conn.run_sync(partitions.ensure_partitions, today, PARTITION_MONTHS_AHEAD)
+        existing = await conn.run_sync(partitions.list_partitions)
+
+    archived = []
+    if HISTORY_RETENTION_MONTHS > 0:
+        cutoff = partitions.add_months(partitions.month_start(today), -HISTORY_RETENTION_MONTHS)
+        for month, name, attached in existing:
+            if month >= cutoff:
+                continue
+            if attached:
+                # DETACH коротко блокирует родителя; дальше запросы к журналу секцию не видят
+                async with engine.begin() as conn:
+                    await _no_statement_timeout(conn)
+                    await conn.execute(text(f"ALTER TABLE {partitions.PARENT} DETACH PARTITION {name}"))
+            async with engine.begin() as conn:
+                await _no_statement_timeout(conn)
+                archived.append(await _archive_partition(conn, name))
+            async with engine.begin() as conn:
+                await _no_statement_timeout(conn)
+                await conn.execute(text(f"DROP TABLE {name}"))
+    return created, archived
+
+
+@db_timed
+async def get_data_version(user_id=None):
+    # Дешёвая версия данных для кэша отчётов: индекс по первичному ключу, одна строка.
+    # Читается из того же источника, что и сам отчёт
+    async with read_session(user_id) as session:
+        result = await session.execute(select(func.max(Transaction.id)))
+        return (result.scalar_one(), _local_writes)
+
+
+HISTORY_COLUMNS = (
+    Transaction.id, Transaction.artikul, Transaction.type, Transaction.quantity,
+    Transaction.old_quantity, Transaction.new_quantity, Transaction.user_id,
+    Transaction.details, Transaction.timestamp,
+)
+
+
+def _history_query(filters):
+    # filters: artikul, type, user_id, date_from, date_to (включительно), after_id
+    query = select(*HISTORY_COLUMNS)
+    if filters.get("artikul"):
+        query = query.where(Transaction.artikul == filters["artikul"])
+    if filters.get("type"):
+        query = query.where(Transaction.type == filters["type"])
+    if filters.get("user_id"):
+        query = query.where(Transaction.user_id == filters["user_id"])
+    # Условия на timestamp — это ключ секционирования журнала: Postgres отсекает
+    # месячные секции вне периода и читает только нужные
+    if filters.get("date_from"):
+        query = query.where(Transaction.timestamp >= filters["date_from"])
+    if filters.get("date_to"):
+        query = query.where(Transaction.timestamp < filters["date_to"] + timedelta(days=1))
+    if filters.get("after_id"):
+        # keyset-пагинация: стоимость страницы не зависит от её номера
+        query = query.where(Transaction.id > filters["after_id"])
+    return query.order_by(Transaction.id)
+
+
+@db_timed
+async def get_history(filters=None, batch_size=HISTORY_BATCH_SIZE, user_id=None):
+    # Серверный курсор: строки приходят пачками и не копятся в памяти целиком
+    async with read_session(user_id) as session:
+        result = await session.stream(
+            _history_query(filters or {}).execution_options(yield_per=batch_size)
+        )
+        async for rows in result.partitions():
+            yield [tuple(row) for row in rows]
 
 
+@db_timed
+async def get_history_page(filters, limit, user_id=None):
+    async with read_session(user_id) as session:
+        result = await session.execute(_history_query(filters).limit(limit))
+        return [tuple(row) for row in result.all()]
@@ -0,0 +1,65 @@
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+
+
+# update_id апдейта Telegram, который сейчас обрабатывается; выставляется IdempotencyMiddleware
+current_update_id = ContextVar("current_update_id", default=None)
+
+
+class DuplicateUpdate(Exception):
+    """Изменение по этому update_id уже закоммичено (повторная доставка апдейта)."""
+
+
+class UpdateDedupe:
+    """Ограниченный LRU-кэш update_id с временем жизни — быстрый путь отсечения повторов.
+
+    После рестарта или в другом воркере кэш пуст; тогда повтор отсекает таблица
+    processed_updates в той же транзакции, что и само изменение.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.dropped_memory = 0
+        self.dropped_db = 0
+        self.evictions = 0
+        self._seen = OrderedDict()
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0
+
+    def check(self, update_id):
+        """True — апдейт новый и теперь отмечен, False — повтор."""
+        if not self.enabled:
+            return True
+        now = time.monotonic()
+        seen_at = self._seen.get(update_id)
+        if seen_at is not None and now - seen_at < self.ttl:
+            self.dropped_memory += 1
+            return False
+
+        self._seen[update_id] = now
+        self._seen.move_to_end(update_id)
+        # Самые старые записи в начале: вытесняем и переполнение, и истёкшие
+        while self._seen:
+            oldest, seen_at = next(iter(self._seen.items()))
+            if len(self._seen) <= self.maxsize and now - seen_at < self.ttl:
+                break
+            self._seen.popitem(last=False)
+            self.evictions += 1
+        return True
+
+    def forget(self, update_id):
+        # Обработка упала: повторная доставка должна пройти
+        self._seen.pop(update_id, None)
+
+    def stats(self):
+        return {
+            "size": len(self._seen),
+            "maxsize": self.maxsize,
+            "dropped_memory": self.dropped_memory,
+            "dropped_db": self.dropped_db,
+            "evictions": self.evictions,
+        }
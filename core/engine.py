@@ -0,0 +1,166 @@
+import time
+from sqlalchemy import event
+from core.settings import (
+    DB_PROFILE, env_int, env_bool,
+    SQLITE_BUSY_TIMEOUT_MS, SQLITE_CACHE_MB, SQLITE_MMAP_MB, SQLITE_SYNCHRONOUS,
+)
+
+
+# Профили движка. Любой параметр можно переопределить переменной окружения DB_<ИМЯ>,
+# например DB_POOL_SIZE=30. pool_size + max_overflow на все процессы бота должны
+# укладываться в max_connections Postgres (100 в docker-compose.yml)
+PROFILES = {
+    "dev": {
+        "echo": True,
+        "pool_size": 5,
+        "max_overflow": 5,
+        "pool_timeout": 30,
+        "pool_pre_ping": True,
+        "pool_recycle": 1800,
+        "statement_cache_size": 100,
+        "statement_timeout_ms": 0,
+    },
+    "prod": {
+        "echo": False,
+        "pool_size": 20,
+        "max_overflow": 10,
+        "pool_timeout": 10,
+        "pool_pre_ping": True,
+        "pool_recycle": 1800,
+        "statement_cache_size": 500,
+        "statement_timeout_ms": 5000,
+    },
+    "bench": {
+        "echo": False,
+        "pool_size": 40,
+        "max_overflow": 0,
+        "pool_timeout": 30,
+        "pool_pre_ping": False,
+        "pool_recycle": -1,
+        "statement_cache_size": 1000,
+        "statement_timeout_ms": 60000,
+    },
+}
+
+
+def engine_settings(profile=DB_PROFILE):
+    if profile not in PROFILES:
+        raise ValueError(f"Неизвестный профиль БД {profile}, доступны: {', '.join(PROFILES)}")
+    settings = dict(PROFILES[profile])
+    for name, default in settings.items():
+        env_name = f"DB_{name.upper()}"
+        if isinstance(default, bool):
+            settings[name] = env_bool(env_name, default)
+        else:
+            settings[name] = env_int(env_name, default)
+    return settings
+
+
+def engine_options(url, profile=DB_PROFILE):
+    settings = engine_settings(profile)
+    options = {
+        "echo": settings["echo"],
+        "pool_size": settings["pool_size"],
+        "max_overflow": settings["max_overflow"],
+        "pool_timeout": settings["pool_timeout"],
+        "pool_pre_ping": settings["pool_pre_ping"],
+        "pool_recycle": settings["pool_recycle"],
+    }
+
+    if url.startswith("postgresql+asyncpg"):
+        server_settings = {}
+        if settings["statement_timeout_ms"]:
+            server_settings["statement_timeout"] = str(settings["statement_timeout_ms"])
+        options["connect_args"] = {
+            # кэш подготовленных выражений asyncpg; 0 — выключить (нужно за pgbouncer в transaction mode)
+            "statement_cache_size": settings["statement_cache_size"],
+            "server_settings": server_settings,
+        }
+    elif url.startswith("sqlite"):
+        if ":memory:" in url or url.rstrip("/").endswith(":"):
+            # База в памяти живёт в одном соединении (StaticPool), параметры пула к ней неприменимы
+            for name in ("pool_size", "max_overflow", "pool_timeout"):
+                options.pop(name)
+        options["pool_pre_ping"] = False
+    return options
+
+
+# WAL: читатели не блокируют писателя и наоборот; synchronous=NORMAL в WAL не теряет
+# целостность, только последние транзакции при отключении питания; busy_timeout вместо
+# мгновенного «database is locked», если файл пишет другой процесс
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": SQLITE_SYNCHRONOUS,
+    "busy_timeout": SQLITE_BUSY_TIMEOUT_MS,
+    "foreign_keys": "ON",
+    "temp_store": "MEMORY",
+    "cache_size": -SQLITE_CACHE_MB * 1024,
+    "mmap_size": SQLITE_MMAP_MB * 1024 * 1024,
+}
+
+
+def sqlite_lower(value):
+    # Встроенный lower() в SQLite меняет регистр только у ASCII: «Мышь» и «мышь» для него
+    # разные названия. NULL и не-строки возвращаются как есть
+    return value.lower() if isinstance(value, str) else value
+
+
+def attach_sqlite_pragmas(sync_engine, pragmas=SQLITE_PRAGMAS):
+    # PRAGMA действуют на соединение, поэтому выставляются при каждом новом подключении пула.
+    # Там же подменяется lower(): на нём держатся уникальный индекс ux_stock_name_lower,
+    # проверка дубликатов в /new и /import и поиск /find без индекса в памяти
+    @event.listens_for(sync_engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+        dbapi_connection.create_function("lower", 1, sqlite_lower, deterministic=True)
+
+
+class PoolMetrics:
+    """Занятость пула и время ожидания соединения."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.checked_out = 0
+        self.max_checked_out = 0
+        self.checkouts = 0
+        self.connects = 0
+        self.waits = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def attach(self, sync_engine):
+        event.listen(sync_engine.pool, "connect", self._on_connect)
+        event.listen(sync_engine.pool, "checkout", self._on_checkout)
+        event.listen(sync_engine.pool, "checkin", self._on_checkin)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        self.connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        self.checkouts += 1
+        self.checked_out += 1
+        self.max_checked_out = max(self.max_checked_out, self.checked_out)
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        self.checked_out = max(self.checked_out - 1, 0)
+
+    def observe_wait(self, started):
+        wait = time.perf_counter() - started
+        self.waits += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+
+    def stats(self):
+        return {
+            "capacity": self.capacity,
+            "checked_out": self.checked_out,
+            "max_checked_out": self.max_checked_out,
+            "utilization": self.checked_out / self.capacity if self.capacity else 0.0,
+            "checkouts": self.checkouts,
+            "connects": self.connects,
+            "wait_avg_ms": self.wait_total / self.waits * 1000 if self.waits else 0.0,
+            "wait_max_ms": self.wait_max * 1000,
+        }
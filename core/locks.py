@@ -0,0 +1,77 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+
+class KeyedLocks:
+    """asyncio.Lock на каждый ключ (артикул) вместо одной общей блокировки.
+
+    Замки создаются по требованию и удаляются, когда ими никто не пользуется,
+    поэтому словарь не растёт вместе с каталогом. Несколько ключей берутся
+    в отсортированном порядке — две пачки с общими артикулами не заблокируют друг друга.
+    """
+
+    def __init__(self):
+        # ключ -> [замок, сколько корутин держат или ждут его]
+        self._locks = {}
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    @asynccontextmanager
+    async def hold(self, keys):
+        acquired = []
+        try:
+            for key in sorted(set(keys)):
+                await self._acquire(key)
+                acquired.append(key)
+            yield
+        finally:
+            for key in reversed(acquired):
+                self._release(key)
+
+    async def _acquire(self, key):
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        self.acquisitions += 1
+
+        lock = entry[0]
+        if entry[1] == 1:
+            # Замок свободен и очереди нет — acquire() вернётся без ожидания
+            await lock.acquire()
+            return
+
+        self.contended += 1
+        started = time.perf_counter()
+        try:
+            await lock.acquire()
+        except BaseException:
+            # Отмена во время ожидания: замок не взят, но ссылку надо вернуть
+            self._unref(key, entry)
+            raise
+        wait = time.perf_counter() - started
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+
+    def _release(self, key):
+        entry = self._locks[key]
+        entry[0].release()
+        self._unref(key, entry)
+
+    def _unref(self, key, entry):
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self._locks[key]
+
+    def stats(self):
+        return {
+            "keys": len(self._locks),
+            "acquisitions": self.acquisitions,
+            "contended": self.contended,
+            "contention_ratio": self.contended / self.acquisitions if self.acquisitions else 0.0,
+            "wait_avg_ms": self.wait_total / self.contended * 1000 if self.contended else 0.0,
+            "wait_max_ms": self.wait_max * 1000,
+        }
@@ -0,0 +1,184 @@
+import functools
+import inspect
+import time
+from contextvars import ContextVar
+
+
+# Имя функции core.database, которая сейчас выполняется — по нему профилировщик SQL
+# приписывает запросы вызывающей функции
+current_db_function = ContextVar("current_db_function", default=None)
+
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{str(value).replace(chr(34), chr(39))}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.values = {}
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in self.values.items():
+            yield self.name, _labels(self.labelnames, labels), value
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value, *labels):
+        self.values[labels] = value
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # labels -> [счётчики по корзинам..., сумма, количество]
+        self.values = {}
+
+    def observe(self, value, *labels):
+        data = self.values.get(labels)
+        if data is None:
+            data = self.values[labels] = [0] * len(self.buckets) + [0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                data[i] += 1
+        data[-2] += value
+        data[-1] += 1
+
+    def quantile(self, q, *labels):
+        # Оценка по верхней границе корзины — для /stats этого достаточно
+        data = self.values.get(labels)
+        if not data or not data[-1]:
+            return None
+        rank = q * data[-1]
+        for i, bound in enumerate(self.buckets):
+            if data[i] >= rank:
+                return bound
+        return float("inf")
+
+    def samples(self):
+        for labels, data in self.values.items():
+            for i, bound in enumerate(self.buckets):
+                yield f"{self.name}_bucket", _labels(self.labelnames + ("le",), labels + (bound,)), data[i]
+            yield f"{self.name}_bucket", _labels(self.labelnames + ("le",), labels + ("+Inf",)), data[-1]
+            yield f"{self.name}_sum", _labels(self.labelnames, labels), data[-2]
+            yield f"{self.name}_count", _labels(self.labelnames, labels), data[-1]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, prefix, collect):
+        # collect() -> dict числовых значений, например stats() кэша или пула
+        self.collectors.append((prefix, collect))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {value}")
+        for prefix, collect in self.collectors:
+            for key, value in collect().items():
+                if isinstance(value, (int, float)):
+                    lines.append(f"# TYPE {prefix}_{key} gauge")
+                    lines.append(f"{prefix}_{key} {float(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+command_seconds = registry.register(Histogram("bot_command_seconds", "Время обработки команды", ("command",)))
+command_errors = registry.register(Counter("bot_command_errors_total", "Ошибки в хендлерах", ("command",)))
+commands_in_flight = registry.register(Gauge("bot_commands_in_flight", "Команды в обработке", ("command",)))
+db_call_seconds = registry.register(Histogram("db_call_seconds", "Время вызова функций core.database", ("function",)))
+db_call_errors = registry.register(Counter("db_call_errors_total", "Исключения в функциях core.database", ("function",)))
+report_build_seconds = registry.register(Histogram("report_build_seconds", "Время сборки Excel-отчёта", ("kind",)))
+telegram_api_seconds = registry.register(Histogram("telegram_api_seconds", "Время вызова Bot API", ("method",)))
+
+
+def timed(histogram, errors=None, label=None, context=None):
+    """Декоратор: время выполнения корутины или асинхронного генератора в histogram.
+
+    context — ContextVar, в который на время вызова кладётся имя функции.
+    """
+
+    def decorator(func):
+        name = label or func.__name__
+
+        if inspect.isasyncgenfunction(func):
+            @functools.wraps(func)
+            async def gen_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                agen = func(*args, **kwargs)
+                try:
+                    while True:
+                        # переменная ставится только на время шага генератора,
+                        # чтобы не протекать в код потребителя между yield
+                        token = context.set(name) if context is not None else None
+                        try:
+                            item = await agen.__anext__()
+                        except StopAsyncIteration:
+                            break
+                        finally:
+                            if token is not None:
+                                context.reset(token)
+                        yield item
+                except Exception:
+                    if errors is not None:
+                        errors.inc(name)
+                    raise
+                finally:
+                    await agen.aclose()
+                    histogram.observe(time.perf_counter() - started, name)
+            return gen_wrapper
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            token = context.set(name) if context is not None else None
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                if errors is not None:
+                    errors.inc(name)
+                raise
+            finally:
+                if token is not None:
+                    context.reset(token)
+                histogram.observe(time.perf_counter() - started, name)
+        return wrapper
+
+    return decorator
+
+
+def db_timed(func):
+    return timed(db_call_seconds, db_call_errors, context=current_db_function)(func)
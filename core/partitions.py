@@ -0,0 +1,186 @@
+import asyncio
+import re
+from datetime import date
+
+from sqlalchemy import text
+
+from models.transactions import Transaction
+
+
+# Журнал операций в Postgres разбит на месячные RANGE-секции по timestamp:
+# transactions_y2026m03 и т.д. плюс transactions_default для всего, что не попало в месяцы
+PARENT = Transaction.__tablename__
+DEFAULT_PARTITION = f"{PARENT}_default"
+PARTITION_RE = re.compile(rf"^{PARENT}_y(\d{{4}})m(\d{{2}})$")
+
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def add_months(month, count):
+    years, index = divmod(month.month - 1 + count, 12)
+    return date(month.year + years, index + 1, 1)
+
+
+def partition_name(month):
+    return f"{PARENT}_y{month:%Y}m{month:%m}"
+
+
+def partition_month(name):
+    match = PARTITION_RE.match(name)
+    return date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+def is_partitioned(conn):
+    return conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = :name AND pg_table_is_visible(c.oid))"
+    ), {"name": PARENT}).scalar()
+
+
+def list_partitions(conn):
+    # [(месяц, имя, подключена ли секция)] — отключённые секции остаются после
+    # прерванной архивации и подбираются следующим запуском обслуживания
+    rows = conn.execute(text(
+        "SELECT relname, relispartition FROM pg_class "
+        "WHERE relkind = 'r' AND relname LIKE :prefix AND pg_table_is_visible(oid)"
+    ), {"prefix": f"{PARENT}\\_y%"}).all()
+    result = []
+    for name, attached in rows:
+        month = partition_month(name)
+        if month:
+            result.append((month, name, attached))
+    return sorted(result)
+
+
+def create_partition(conn, month):
+    # Создаётся отдельная таблица и подключается через ATTACH: если в default-секции уже
+    # лежат строки этого месяца, они переносятся, и подключение не падает
+    name = partition_name(month)
+    if conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar():
+        return False
+    bounds = {"start": month, "end": add_months(month, 1)}
+    conn.execute(text(f'CREATE TABLE {name} (LIKE {PARENT} INCLUDING DEFAULTS)'))
+    conn.execute(text(
+        f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} '
+        f'WHERE "timestamp" >= :start AND "timestamp" < :end RETURNING *) '
+        f'INSERT INTO {name} SELECT * FROM moved'
+    ), bounds)
+    conn.execute(text(
+        f"ALTER TABLE {PARENT} ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{bounds['start']}') TO ('{bounds['end']}')"
+    ))
+    return True
+
+
+def ensure_partitions(conn, today, months_ahead):
+    # Секции на текущий месяц и months_ahead вперёд; возвращает имена созданных
+    month = month_start(today)
+    created = []
+    for offset in range(months_ahead + 1):
+        current = add_months(month, offset)
+        if create_partition(conn, current):
+            created.append(partition_name(current))
+    return created
+
+
+def partition_transactions(conn, today, months_ahead):
+    # Перевод обычной таблицы transactions в секционированную. Первичный ключ
+    # секционированной таблицы обязан включать ключ секционирования: (id, timestamp)
+    if is_partitioned(conn):
+        return False
+
+    old = f"{PARENT}_unpartitioned"
+    sequence = conn.execute(text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": PARENT}).scalar()
+    for index in Transaction.__table__.indexes:
+        conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+    conn.execute(text(f"ALTER TABLE {PARENT} RENAME TO {old}"))
+    conn.execute(text(f"ALTER TABLE {old} DROP CONSTRAINT IF EXISTS {PARENT}_pkey"))
+    conn.execute(text(f'UPDATE {old} SET "timestamp" = now() WHERE "timestamp" IS NULL'))
+
+    conn.execute(text(f'CREATE TABLE {PARENT} (LIKE {old} INCLUDING DEFAULTS) PARTITION BY RANGE ("timestamp")'))
+    conn.execute(text(f'ALTER TABLE {PARENT} ALTER COLUMN "timestamp" SET NOT NULL'))
+    conn.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {PARENT} DEFAULT"))
+
+    first = conn.execute(text(f'SELECT min("timestamp") FROM {old}')).scalar()
+    month = month_start(first) if first else month_start(today)
+    last = add_months(month_start(today), months_ahead)
+    while month <= last:
+        create_partition(conn, month)
+        month = add_months(month, 1)
+
+    conn.execute(text(f"INSERT INTO {PARENT} SELECT * FROM {old}"))
+
+    # Индексы строятся после заливки: так быстрее, чем поддерживать их на каждой вставке
+    conn.execute(text(f'ALTER TABLE {PARENT} ADD CONSTRAINT {PARENT}_pkey PRIMARY KEY (id, "timestamp")'))
+    for index in Transaction.__table__.indexes:
+        index.create(conn)
+    if sequence:
+        conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {PARENT}.id"))
+    conn.execute(text(f"DROP TABLE {old}"))
+    return True
+
+
+def unpartition_transactions(conn):
+    # Обратное преобразование для downgrade: архивированные секции не возвращаются
+    if not is_partitioned(conn):
+        return False
+
+    old = f"{PARENT}_partitioned"
+    sequence = conn.execute(text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": PARENT}).scalar()
+    for index in Transaction.__table__.indexes:
+        conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+    conn.execute(text(f"ALTER TABLE {PARENT} RENAME TO {old}"))
+    conn.execute(text(f"ALTER TABLE {old} DROP CONSTRAINT IF EXISTS {PARENT}_pkey"))
+
+    conn.execute(text(f"CREATE TABLE {PARENT} (LIKE {old} INCLUDING DEFAULTS)"))
+    conn.execute(text(f'ALTER TABLE {PARENT} ALTER COLUMN "timestamp" DROP NOT NULL'))
+    conn.execute(text(f"INSERT INTO {PARENT} SELECT * FROM {old}"))
+    conn.execute(text(f"ALTER TABLE {PARENT} ADD CONSTRAINT {PARENT}_pkey PRIMARY KEY (id)"))
+    for index in Transaction.__table__.indexes:
+        index.create(conn)
+    if sequence:
+        conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {PARENT}.id"))
+    conn.execute(text(f"DROP TABLE {old} CASCADE"))
+    return True
+
+
+class PartitionMaintainer:
+    """Фоновая задача: при старте и затем раз в interval секунд создаёт будущие секции
+    журнала и архивирует устаревшие."""
+
+    def __init__(self, maintain, interval):
+        self.maintain = maintain
+        self.interval = interval
+        self.runs = 0
+        self._task = None
+
+    def start(self):
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                result = await self.maintain()
+                self.runs += 1
+                if result:
+                    created, archived = result
+                    if created:
+                        print(f"Созданы секции журнала: {', '.join(created)}")
+                    for path in archived:
+                        print(f"Секция журнала выгружена в архив {path}")
+            except Exception as e:
+                print(f"Ошибка обслуживания секций журнала: {e}")
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,101 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+from core.metrics import registry, current_db_function, Counter, Histogram
+from core.settings import SLOW_QUERY_MS, SLOW_QUERY_LOG, COMMAND_QUERY_WARN
+
+
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 4, 5, 8, 13, 21, 50, 100)
+
+sql_query_seconds = registry.register(Histogram("sql_query_seconds", "Время SQL-запроса по вызывающей функции", ("function",)))
+sql_rows = registry.register(Counter("sql_rows_total", "Строк затронуто или возвращено", ("function",)))
+sql_slow_queries = registry.register(Counter("sql_slow_queries_total", "Запросы дольше порога", ("function",)))
+command_queries = registry.register(Histogram("bot_command_queries", "SQL-запросов на одну команду", ("command",), buckets=QUERY_COUNT_BUCKETS))
+command_checkouts = registry.register(Counter("bot_command_pool_checkouts_total", "Соединений взято из пула", ("command",)))
+
+# [команда, запросов, соединений] текущей команды бота
+_command = ContextVar("sql_command", default=None)
+
+profiler = None
+
+
+@contextmanager
+def command_scope(command):
+    if profiler is None:
+        yield None
+        return
+
+    state = [command, 0, 0]
+    token = _command.set(state)
+    try:
+        yield state
+    finally:
+        _command.reset(token)
+        command_queries.observe(state[1], command)
+        command_checkouts.inc(command, amount=state[2])
+        profiler.check_command(state)
+
+
+class QueryProfiler:
+    """Профилировщик на событиях движка: время и строки каждого запроса,
+    привязка к функции core.database и к команде бота, лог медленных запросов."""
+
+    def __init__(self, slow_ms, command_query_warn, slow_logger):
+        self.slow_seconds = slow_ms / 1000
+        self.command_query_warn = command_query_warn
+        self.slow_logger = slow_logger
+
+    def attach(self, sync_engine):
+        event.listen(sync_engine, "before_cursor_execute", self._before)
+        event.listen(sync_engine, "after_cursor_execute", self._after)
+        event.listen(sync_engine, "handle_error", self._error)
+        event.listen(sync_engine.pool, "checkout", self._checkout)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        function = current_db_function.get() or "unknown"
+
+        sql_query_seconds.observe(elapsed, function)
+        if cursor.rowcount and cursor.rowcount > 0:
+            sql_rows.inc(function, amount=cursor.rowcount)
+
+        state = _command.get()
+        if state is not None:
+            state[1] += 1
+
+        if elapsed >= self.slow_seconds:
+            sql_slow_queries.inc(function)
+            command = state[0] if state else "-"
+            self.slow_logger.info(
+                f"{elapsed * 1000:.1f} ms | {function} | {command} | rows {cursor.rowcount} | "
+                f"{' '.join(statement.split())} | {parameters!r:.500}"
+            )
+
+    def _error(self, exception_context):
+        # after_cursor_execute при ошибке не вызывается — снимаем отметку времени сами
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_started"):
+            conn.info["query_started"].pop()
+
+    def _checkout(self, dbapi_connection, connection_record, connection_proxy):
+        state = _command.get()
+        if state is not None:
+            state[2] += 1
+
+    def check_command(self, state):
+        # Много запросов на одну команду — обычно лишний повторный SELECT
+        if self.command_query_warn and state[1] > self.command_query_warn:
+            self.slow_logger.info(f"{state[1]} queries | {state[0]} | {state[2]} pool checkouts")
+
+
+def enable(sync_engine):
+    global profiler
+    from logger.logger import setup_slow_query_logger
+
+    profiler = QueryProfiler(SLOW_QUERY_MS, COMMAND_QUERY_WARN, setup_slow_query_logger(SLOW_QUERY_LOG))
+    profiler.attach(sync_engine)
+    return profiler
@@ -0,0 +1,124 @@
+import heapq
+import math
+from collections import Counter
+
+
+def trigrams(text):
+    # Как в pg_trgm: слова в нижнем регистре, два пробела в начале и один в конце
+    result = set()
+    for word in text.lower().split():
+        padded = f"  {word} "
+        for i in range(len(padded) - 2):
+            result.add(padded[i:i + 3])
+    return result
+
+
+class NgramIndex:
+    """Триграммный индекс названий в памяти — замена pg_trgm для SQLite и тестов."""
+
+    def __init__(self, max_work=50_000):
+        # Бюджет запроса: сколько пар «кандидат × список триграмм» можно проверить
+        self.max_work = max_work
+        self._names = {}
+        self._grams = {}
+        # артикул -> (число триграмм, артикул): порядок внутри равного совпадения,
+        # готовый ключ сортировки без лямбды на каждого кандидата
+        self._rank = {}
+        self._postings = {}
+
+    def __len__(self):
+        return len(self._names)
+
+    def add(self, artikul, name):
+        if self._names.get(artikul) == name:
+            return
+        self.remove(artikul)
+        grams = trigrams(name)
+        self._names[artikul] = name
+        self._grams[artikul] = grams
+        self._rank[artikul] = (len(grams), artikul)
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(artikul)
+
+    def remove(self, artikul):
+        if self._names.pop(artikul, None) is None:
+            return
+        del self._rank[artikul]
+        for gram in self._grams.pop(artikul):
+            postings = self._postings[gram]
+            postings.discard(artikul)
+            if not postings:
+                del self._postings[gram]
+
+    def load(self, items):
+        self._names.clear()
+        self._grams.clear()
+        self._rank.clear()
+        self._postings.clear()
+        for artikul, name in items:
+            self.add(artikul, name)
+
+    def search(self, query, limit=10, threshold=0.6):
+        query_grams = trigrams(query)
+        if not query_grams:
+            return []
+
+        # Кандидат должен содержать не меньше minimum триграмм запроса, значит он точно
+        # встречается хотя бы в одном из (n - minimum + 1) самых редких списков —
+        # частые триграммы вроде «  м» только пересекаются с уже найденными кандидатами
+        total = len(query_grams)
+        minimum = max(1, math.ceil(threshold * total))
+        postings = sorted((self._postings.get(gram, set()) for gram in query_grams), key=len)
+
+        # Ранняя остановка: если все триграммы запроса есть хотя бы у limit названий, лучше
+        # них ничего нет — хватает пересечения списков (в C, от самого короткого), и широкий
+        # запрос вроде «кабель hdmi» не пересчитывает десятки тысяч частичных совпадений
+        exact = set.intersection(*postings) if postings[0] else set()
+        if len(exact) >= limit:
+            best = heapq.nsmallest(limit, exact, key=self._rank.__getitem__)
+            return [(artikul, self._names[artikul], 1.0) for artikul in best]
+
+        # Остальное — по уровням: после k самых редких списков любой ещё не встреченный
+        # кандидат совпадает не больше чем по total - k триграммам. Как только найдено limit
+        # названий лучше этой границы, оставшиеся (самые длинные) списки не раскрываются.
+        # Число общих триграмм у новых кандидатов считается сразу по всем следующим спискам
+        split = total - minimum + 1
+        # Счётчики по шагам: каждый кандидат попадает ровно в один, объединять их не нужно
+        counted = []
+        levels = Counter()
+        seen = set()
+        work = 0
+        for k, posting in enumerate(postings[:split], 1):
+            new = posting - seen
+            work += len(new) * (total - k + 1)
+            if work > self.max_work and seen:
+                # Запрос из множества частых триграмм: дальше только слабые совпадения,
+                # их полный подсчёт не укладывается в бюджет — жертвуем хвостом выдачи
+                break
+            if new:
+                seen |= new
+                fresh = Counter()
+                for other in postings[k - 1:]:
+                    fresh.update(new & other)
+                counted.append(fresh)
+                levels.update(fresh.values())
+            bound = max(total - k + 1, minimum)
+            if sum(levels[common] for common in range(bound, total + 1)) >= limit:
+                break
+
+        # Как word_similarity() в pg_trgm: какая доля запроса нашлась в названии;
+        # при равенстве выше короткие названия (similarity по объединению).
+        # По гистограмме levels находится порог cut, при котором набирается limit названий:
+        # сортируются только они, а не тысячи слабых совпадений широкого запроса
+        cut = total
+        found = levels[total]
+        while found < limit and cut > minimum:
+            cut -= 1
+            found += levels[cut]
+        above = sorted(
+            ((common, artikul) for fresh in counted for artikul, common in fresh.items() if common > cut),
+            key=lambda match: (-match[0], self._rank[match[1]]),
+        )
+        ties = [artikul for fresh in counted for artikul, common in fresh.items() if common == cut]
+        best = above + [(cut, artikul) for artikul in heapq.nsmallest(limit - len(above), ties, key=self._rank.__getitem__)]
+        return [(artikul, self._names[artikul], common / total) for common, artikul in best]
@@ -0,0 +1,136 @@
+import os
+
+# core.config загружает .env, поэтому импортируем его первым
+import core.config  # noqa: F401
+
+
+def env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def env_float(name, default):
+    value = os.getenv(name)
+    return float(value) if value not in (None, "") else default
+
+
+def env_bool(name, default):
+    value = os.getenv(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# Полный URL базы вместо PG_URL из core.config, например sqlite+aiosqlite:///bench.db
+DATABASE_URL = os.getenv("DATABASE_URL", "")
+
+# Реплика только для чтения (отчёты, /stock, /history); пусто — всё читается с основной базы.
+# После записи пользователь READ_YOUR_WRITES_SECONDS секунд читает с основной, чтобы видеть свои изменения
+REPLICA_URL = os.getenv("REPLICA_URL", "")
+READ_YOUR_WRITES_SECONDS = env_float("READ_YOUR_WRITES_SECONDS", 5)
+
+# Postgres: изменения одного артикула из разных процессов бота идут по очереди (pg_advisory_xact_lock)
+ARTIKUL_ADVISORY_LOCKS = env_bool("ARTIKUL_ADVISORY_LOCKS", True)
+
+# SQLite (DATABASE_URL=sqlite+aiosqlite:///...): ожидание блокировки файла, кэш страниц
+# и mmap на соединение, режим синхронизации WAL
+SQLITE_BUSY_TIMEOUT_MS = env_int("SQLITE_BUSY_TIMEOUT_MS", 5000)
+SQLITE_CACHE_MB = env_int("SQLITE_CACHE_MB", 64)
+SQLITE_MMAP_MB = env_int("SQLITE_MMAP_MB", 256)
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL").upper()
+
+# Кэш остатков в памяти процесса (0 — выключен)
+STOCK_CACHE_SIZE = env_int("STOCK_CACHE_SIZE", 10000)
+
+# Размер пачки при потоковой выгрузке истории
+HISTORY_BATCH_SIZE = env_int("HISTORY_BATCH_SIZE", 1000)
+
+# Генерация Excel-отчётов: потоки пула и сколько отчётов строится одновременно
+REPORT_WORKERS = env_int("REPORT_WORKERS", 2)
+REPORT_CONCURRENCY = env_int("REPORT_CONCURRENCY", 2)
+
+# Кэш готовых отчётов (0 записей — выключен)
+REPORT_CACHE_ENTRIES = env_int("REPORT_CACHE_ENTRIES", 16)
+REPORT_CACHE_BYTES = env_int("REPORT_CACHE_BYTES", 64 * 1024 * 1024)
+
+# Сколько строк истории показывать сообщением вместо Excel-файла
+HISTORY_PAGE_SIZE = env_int("HISTORY_PAGE_SIZE", 20)
+
+# Логи: ротация size | time | none, сжатие ротированных файлов, формат text | json
+LOG_ROTATE = os.getenv("LOG_ROTATE", "size").lower()
+LOG_MAX_BYTES = env_int("LOG_MAX_BYTES", 10 * 1024 * 1024)
+LOG_BACKUP_COUNT = env_int("LOG_BACKUP_COUNT", 10)
+LOG_ROTATE_WHEN = os.getenv("LOG_ROTATE_WHEN", "midnight")
+LOG_COMPRESS = env_bool("LOG_COMPRESS", True)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+
+# Group-commit журнала операций (по умолчанию журнал пишется в транзакции изменения)
+AUDIT_BATCHING = env_bool("AUDIT_BATCHING", False)
+AUDIT_DURABLE = env_bool("AUDIT_DURABLE", True)
+AUDIT_BATCH_SIZE = env_int("AUDIT_BATCH_SIZE", 200)
+AUDIT_FLUSH_MS = env_int("AUDIT_FLUSH_MS", 50)
+AUDIT_QUEUE_SIZE = env_int("AUDIT_QUEUE_SIZE", 10000)
+# Повторы неудачной вставки журнала и пауза перед первым повтором (дальше удваивается)
+AUDIT_RETRIES = env_int("AUDIT_RETRIES", 5)
+AUDIT_RETRY_MS = env_int("AUDIT_RETRY_MS", 100)
+
+# Профиль движка БД: dev | prod | bench (см. core/engine.py)
+DB_PROFILE = os.getenv("DB_PROFILE", "prod").lower()
+
+# Режим запуска: polling | webhook
+RUN_MODE = os.getenv("RUN_MODE", "polling").lower()
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "127.0.0.1")
+WEBHOOK_PORT = env_int("WEBHOOK_PORT", 8080)
+WEBHOOK_REUSE_PORT = env_bool("WEBHOOK_REUSE_PORT", False)
+# Сколько процессов бота работают с одной базой. Кэш остатков, индекс /find в памяти и
+# read-your-writes видят только записи своего процесса, поэтому при нескольких воркерах
+# (или WEBHOOK_REUSE_PORT=1) кэши выключаются, а чтения пользователя идут на основную базу
+WORKERS = env_int("WORKERS", 1)
+MULTI_WORKER = WORKERS > 1 or WEBHOOK_REUSE_PORT
+# Регистрировать webhook в Telegram при старте (достаточно одного воркера)
+WEBHOOK_REGISTER = env_bool("WEBHOOK_REGISTER", True)
+# Адрес Bot API, например локальный telegram-bot-api или заглушка для нагрузочного теста
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "")
+# Сколько апдейтов обрабатывается одновременно и сколько ждать их при остановке
+HANDLER_CONCURRENCY = env_int("HANDLER_CONCURRENCY", 64)
+SHUTDOWN_TIMEOUT = env_int("SHUTDOWN_TIMEOUT", 30)
+
+# Порт /metrics в polling-режиме (0 — не поднимать; в webhook-режиме /metrics живёт на том же сервере)
+METRICS_PORT = env_int("METRICS_PORT", 0)
+
+# Профилирование SQL: время запросов, число запросов на команду, лог медленных запросов
+SQL_PROFILING = env_bool("SQL_PROFILING", False)
+SLOW_QUERY_MS = env_int("SLOW_QUERY_MS", 200)
+SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG", "slow_queries.log")
+COMMAND_QUERY_WARN = env_int("COMMAND_QUERY_WARN", 5)
+
+# Сколько результатов показывать в /find
+FIND_LIMIT = env_int("FIND_LIMIT", 10)
+
+# Заполнить пустую базу тестовыми товарами при старте
+SEED_TEST_DATA = env_bool("SEED_TEST_DATA", False)
+
+# Снимки остатков для запросов «остаток на дату» (0 — не делать) и сколько дней их хранить (0 — всё)
+SNAPSHOT_INTERVAL_HOURS = env_float("SNAPSHOT_INTERVAL_HOURS", 24)
+SNAPSHOT_RETENTION_DAYS = env_int("SNAPSHOT_RETENTION_DAYS", 90)
+
+# Секции журнала transactions (Postgres): сколько месяцев создавать заранее, сколько
+# месяцев хранить в базе (0 — всё) и куда выгружать устаревшие секции
+PARTITION_MONTHS_AHEAD = env_int("PARTITION_MONTHS_AHEAD", 3)
+HISTORY_RETENTION_MONTHS = env_int("HISTORY_RETENTION_MONTHS", 0)
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+PARTITION_CHECK_HOURS = env_float("PARTITION_CHECK_HOURS", 24)
+
+# Идемпотентность по update_id: LRU повторов в памяти и сколько дней хранить отметки в processed_updates
+DEDUPE_CACHE_SIZE = env_int("DEDUPE_CACHE_SIZE", 10000)
+DEDUPE_TTL_SECONDS = env_int("DEDUPE_TTL_SECONDS", 86400)
+PROCESSED_UPDATES_DAYS = env_int("PROCESSED_UPDATES_DAYS", 2)
+
+# Оповещения о низком остатке: окно сбора пересечений порога в секундах, получатели
+# (id через запятую; пусто — все из белого списка) и сколько строк показывать в /low
+LOW_STOCK_DEBOUNCE_SECONDS = env_float("LOW_STOCK_DEBOUNCE_SECONDS", 30)
+LOW_STOCK_ALERT_IDS = [int(value) for value in os.getenv("LOW_STOCK_ALERT_IDS", "").split(",") if value.strip()]
+LOW_LIMIT = env_int("LOW_LIMIT", 50)
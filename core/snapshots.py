@@ -0,0 +1,44 @@
+import asyncio
+from datetime import datetime
+
+
+class SnapshotScheduler:
+    """Фоновая задача: раз в interval секунд сохраняет остатки в stock_snapshots."""
+
+    def __init__(self, take_snapshot, last_snapshot_time, interval):
+        self.take_snapshot = take_snapshot
+        self.last_snapshot_time = last_snapshot_time
+        self.interval = interval
+        self.runs = 0
+        self._task = None
+
+    def start(self):
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        # После рестарта не ждём полный интервал, если последний снимок уже устарел
+        last = await self.last_snapshot_time()
+        delay = 0
+        if last is not None:
+            delay = max(0.0, self.interval - (datetime.now() - last).total_seconds())
+
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                taken_at, rows = await self.take_snapshot()
+                self.runs += 1
+                print(f"Снимок остатков {taken_at}: {rows} позиций")
+            except Exception as e:
+                print(f"Ошибка снимка остатков: {e}")
+            delay = self.interval
@@ -0,0 +1,71 @@
+from collections import OrderedDict
+from core.settings import REPORT_CACHE_ENTRIES, REPORT_CACHE_BYTES
+from core.metrics import registry
+
+
+class CachedReport:
+    __slots__ = ("filename", "content", "file_id")
+
+    def __init__(self, filename, content, file_id=None):
+        self.filename = filename
+        self.content = content
+        self.file_id = file_id
+
+
+class ReportCache:
+    """Готовые отчёты по ключу (тип, фильтры) и версии данных.
+
+    Версия — max(transactions.id) и счётчик записей процесса: любая запись в склад
+    меняет версию, поэтому старый отчёт просто перестаёт с ней совпадать.
+    """
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._size = 0
+        self._reports = OrderedDict()
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def get(self, kind, filters, version):
+        entry = self._reports.get((kind, filters))
+        if entry is None or entry[0] != version:
+            self.misses += 1
+            return None
+        self._reports.move_to_end((kind, filters))
+        self.hits += 1
+        return entry[1]
+
+    def put(self, kind, filters, version, report):
+        if not self.enabled or len(report.content) > self.max_bytes:
+            return
+        self._drop((kind, filters))
+        self._reports[(kind, filters)] = (version, report)
+        self._size += len(report.content)
+        while len(self._reports) > self.max_entries or self._size > self.max_bytes:
+            self._drop(next(iter(self._reports)))
+
+    def clear(self):
+        self._reports.clear()
+        self._size = 0
+
+    def _drop(self, key):
+        entry = self._reports.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry[1].content)
+
+    def stats(self):
+        return {
+            "entries": len(self._reports),
+            "bytes": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+report_cache = ReportCache(REPORT_CACHE_ENTRIES, REPORT_CACHE_BYTES)
+registry.add_collector("report_cache", report_cache.stats)
@@ -1,14 +1,32 @@
-import openpyxl
-from openpyxl import Workbook
+import io
 from datetime import datetime
+from excel.runner import run_in_pool, report_slot
+from core.metrics import timed, report_build_seconds
 
 
+def _timestamp():
+    return datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+
+
+def _to_bytes(wb):
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+# openpyxl импортируется внутри функций: они выполняются в пуле отчётов,
+# а импорт модуля excel при старте бота остаётся дешёвым
 def create_stock_report(data):
-    filename = f"Остатки_{datetime.now().strftime('%Y-%m-%d')}.xlsx"
+    from openpyxl import Workbook
+    from openpyxl.utils import get_column_letter
+
+    filename = f"Остатки_{_timestamp()}.xlsx"
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Остатки"
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Остатки")
+
+    for col in range(1, 4):
+        ws.column_dimensions[get_column_letter(col)].width = 15
 
     headers = ["Артикул", "Наименование", "Количество"]
     ws.append(headers)
@@ -16,27 +34,49 @@ def create_stock_report(data):
     for row in data:
         ws.append([row[0], row[1], row[2]])
 
-    for col in range(1, 4):
-        ws.column_dimensions[openpyxl.utils.get_column_letter(col)].width = 15
+    return filename, _to_bytes(wb)
 
-    wb.save(filename)
-    return filename
 
-def history_report(data):
-    filename = f"История_{datetime.now().strftime('%Y-%m-%d')}.xlsx"
+@timed(report_build_seconds, label="stock")
+async def stock_report(data):
+    async with report_slot():
+        return await run_in_pool(create_stock_report, data)
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "История"
 
-    headers = ["id", "Артикул", "Тип операции", "Количество", "Прошлое количество", "Новое количество", "user_id", "Детали", "Время операции"]
-    ws.append(headers)
+HISTORY_HEADERS = ["id", "Артикул", "Тип операции", "Количество", "Прошлое количество", "Новое количество", "user_id", "Детали", "Время операции"]
 
-    for row in data:
-        ws.append([row[0], row[1], row[2], row[3], row[4], row[5], row[6], row[7], row[8]])
 
-    for col in range(1, 10):
-        ws.column_dimensions[openpyxl.utils.get_column_letter(col)].width = 25
+def history_workbook():
+    from openpyxl import Workbook
+    from openpyxl.utils import get_column_letter
+
+    # write-only книга сбрасывает строки во временный файл, а не держит их в памяти
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("История")
+
+    # ширину колонок в write-only режиме можно задать только до первой строки
+    for col in range(1, len(HISTORY_HEADERS) + 1):
+        ws.column_dimensions[get_column_letter(col)].width = 25
+
+    ws.append(HISTORY_HEADERS)
+    return wb, ws
+
+
+def _append_rows(ws, rows):
+    for row in rows:
+        ws.append(row)
+
+
+@timed(report_build_seconds, label="history")
+async def history_report(batches):
+    filename = f"История_{_timestamp()}.xlsx"
+
+    async with report_slot():
+        wb, ws = await run_in_pool(history_workbook)
+        # Пачки читаются из БД в event loop, а пишутся в книгу в пуле потоков
+        async for rows in batches:
+            await run_in_pool(_append_rows, ws, rows)
+
+        content = await run_in_pool(_to_bytes, wb)
 
-    wb.save(filename)
-    return filename
\ No newline at end of file
+    return filename, content
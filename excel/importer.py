@@ -0,0 +1,84 @@
+import csv
+import io
+
+
+MAX_ERRORS = 20
+# Заголовок отчёта /report: такая первая строка пропускается
+HEADERS = ("артикул", "наименование", "количество")
+
+
+def _iter_xlsx(content):
+    import openpyxl
+
+    # read_only книга читает лист потоково, не загружая все ячейки в память
+    wb = openpyxl.load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+    try:
+        for row in wb.active.iter_rows(values_only=True):
+            yield row
+    finally:
+        wb.close()
+
+
+def _decode_csv(content):
+    # Excel на русской Windows сохраняет «CSV» в cp1251, а не в UTF-8
+    try:
+        return content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return content.decode("cp1251", errors="replace")
+
+
+def _iter_csv(content):
+    stream = io.StringIO(_decode_csv(content), newline="")
+    sample = stream.read(4096)
+    stream.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    yield from csv.reader(stream, dialect)
+
+
+def _is_header(row):
+    return tuple(str(cell or "").strip().lower() for cell in row[:3]) == HEADERS
+
+
+def parse_stock_file(filename, content):
+    """Разбирает файл в формате отчёта /report: Артикул | Наименование | Количество.
+
+    Возвращает ({артикул: (название, количество)}, [ошибки]); при повторе артикула
+    побеждает последняя строка.
+    """
+    rows = _iter_csv(content) if filename.lower().endswith(".csv") else _iter_xlsx(content)
+    items = {}
+    names = {}
+    errors = []
+
+    for number, row in enumerate(rows, 1):
+        if not row or all(cell in (None, "") for cell in row):
+            continue
+        if number == 1 and _is_header(row):
+            continue
+        if len(row) < 3:
+            errors.append(f"Строка {number}: нужно три колонки")
+        else:
+            artikul, name, quantity = row[0], row[1], row[2]
+            try:
+                quantity = int(quantity)
+            except (TypeError, ValueError):
+                errors.append(f"Строка {number}: количество должно быть числом")
+            else:
+                artikul = str(artikul or "").strip().upper()
+                name = str(name or "").strip()
+                if not artikul or not name:
+                    errors.append(f"Строка {number}: пустой артикул или название")
+                elif quantity < 0:
+                    errors.append(f"Строка {number}: отрицательное количество")
+                elif names.setdefault(name.lower(), artikul) != artikul:
+                    errors.append(f"Строка {number}: название «{name}» уже есть у {names[name.lower()]}")
+                else:
+                    items[artikul] = (name, quantity)
+
+        if len(errors) >= MAX_ERRORS:
+            break
+
+    return items, errors
@@ -0,0 +1,23 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from core.settings import REPORT_WORKERS, REPORT_CONCURRENCY
+
+
+# openpyxl синхронный: сборка и сохранение книги идут в отдельном пуле потоков,
+# чтобы не блокировать event loop бота
+_executor = ThreadPoolExecutor(max_workers=REPORT_WORKERS, thread_name_prefix="report")
+_slots = asyncio.Semaphore(REPORT_CONCURRENCY)
+
+
+async def run_in_pool(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, func, *args)
+
+
+def report_slot():
+    # Ограничивает число отчётов, которые строятся одновременно
+    return _slots
+
+
+def shutdown():
+    _executor.shutdown(wait=True)
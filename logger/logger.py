@@ -1,20 +1,102 @@
+import gzip
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import shutil
 from core.config import LOG_FILE
+from core.settings import LOG_ROTATE, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_ROTATE_WHEN, LOG_COMPRESS, LOG_FORMAT
 
-def setup_logger():
-    logger = logging.getLogger('warehouse_bot')
+
+class JsonFormatter(logging.Formatter):
+    # Одна JSON-строка на запись — удобно грузить в ELK/Loki
+    def format(self, record):
+        return json.dumps({
+            "time": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "user_id": getattr(record, "user_id", None),
+            "command": getattr(record, "command", None),
+            "text": getattr(record, "text", record.getMessage()),
+        }, ensure_ascii=False, default=str)
+
+
+def _gzip_namer(name):
+    return name + ".gz"
+
+
+def _gzip_rotator(source, dest):
+    with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+def file_handler(filename):
+    if LOG_ROTATE == "size":
+        handler = logging.handlers.RotatingFileHandler(
+            filename, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8'
+        )
+    elif LOG_ROTATE == "time":
+        handler = logging.handlers.TimedRotatingFileHandler(
+            filename, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUP_COUNT, encoding='utf-8'
+        )
+    else:
+        return logging.FileHandler(filename, encoding='utf-8')
+
+    if LOG_COMPRESS:
+        handler.namer = _gzip_namer
+        handler.rotator = _gzip_rotator
+    return handler
+
+
+_listeners = []
+
+
+def queued_logger(name, filename, formatter):
+    logger = logging.getLogger(name)
     logger.setLevel(logging.INFO)
+    logger.propagate = False
 
-    # Формат: 2026-02-11 14:35:22 | user 123456789 | /add A-001 5 | успех
-    formatter = logging.Formatter(
-        "%(asctime)s | user %(user_id)s | %(command)s | %(text)s",
-        datefmt="%Y-%m-%d %H-%M-%S"
-    )
+    handler = file_handler(filename)
+    handler.setFormatter(formatter)
 
-    file_handler = logging.FileHandler(LOG_FILE, encoding='utf-8')
-    file_handler.setFormatter(formatter)
+    # Хендлеры вызываются в event loop: в очередь кладём запись, а пишет на диск
+    # фоновый поток QueueListener
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
 
-    logger.addHandler(file_handler)
+    listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    listener.start()
+    _listeners.append(listener)
     return logger
 
-logger = setup_logger()
\ No newline at end of file
+
+def setup_logger():
+    if LOG_FORMAT == "json":
+        formatter = JsonFormatter(datefmt="%Y-%m-%d %H-%M-%S")
+    else:
+        # Формат: 2026-02-11 14:35:22 | user 123456789 | /add A-001 5 | успех
+        formatter = logging.Formatter(
+            "%(asctime)s | user %(user_id)s | %(command)s | %(text)s",
+            datefmt="%Y-%m-%d %H-%M-%S"
+        )
+
+    return queued_logger('warehouse_bot', LOG_FILE, formatter)
+
+
+def setup_slow_query_logger(filename):
+    # Медленные запросы пишутся отдельно от журнала действий пользователей
+    formatter = logging.Formatter("%(asctime)s | %(message)s", datefmt="%Y-%m-%d %H-%M-%S")
+    return queued_logger('warehouse_bot.slow_sql', filename, formatter)
+
+
+logger = setup_logger()
+
+
+def stop_logger():
+    # Дописывает всё, что осталось в очередях, и закрывает файлы
+    for listener in _listeners:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+    _listeners.clear()
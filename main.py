@@ -1,21 +1,119 @@
 import asyncio
+import signal
+from aiohttp import web
 from aiogram import Bot, Dispatcher
-from core.config import BOT_TOKEN
-from core.database import init_db
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from core.config import BOT_TOKEN, ALLOWED_USER_IDS
+from core.database import init_db, audit_writer, take_snapshot, get_last_snapshot_time, maintain_partitions, low_stock
+from core.snapshots import SnapshotScheduler
+from core.partitions import PartitionMaintainer
+from core.settings import (
+    AUDIT_BATCHING, RUN_MODE, HANDLER_CONCURRENCY, SHUTDOWN_TIMEOUT, TELEGRAM_API_URL,
+    WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_REUSE_PORT, WEBHOOK_REGISTER,
+    METRICS_PORT, SNAPSHOT_INTERVAL_HOURS, PARTITION_CHECK_HOURS, LOW_STOCK_ALERT_IDS,
+)
 from bot.handlers import router
-from logger.logger import logger
+from bot.middlewares import ConcurrencyLimitMiddleware, TelegramMetricsMiddleware
+from core.metrics import registry
+from excel import runner as report_runner
+from logger.logger import logger, stop_logger
+
+
+def create_bot():
+    session = None
+    if TELEGRAM_API_URL:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL))
+    bot = Bot(token=BOT_TOKEN, session=session)
+    bot.session.middleware(TelegramMetricsMiddleware())
+    return bot
+
+
+async def metrics_handler(request):
+    return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+
+async def start_metrics_server():
+    # В polling-режиме своего HTTP-сервера нет: /metrics поднимается отдельно, если задан METRICS_PORT
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, WEBHOOK_HOST, METRICS_PORT).start()
+    return runner
+
+
+async def run_webhook(bot, dp, limiter):
+    app = web.Application()
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=WEBHOOK_SECRET).register(app, path=WEBHOOK_PATH)
+    app.router.add_get("/metrics", metrics_handler)
+    setup_application(app, dp, bot=bot)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT, reuse_port=WEBHOOK_REUSE_PORT)
+    await site.start()
+
+    if WEBHOOK_REGISTER and WEBHOOK_URL:
+        await bot.set_webhook(f"{WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}", secret_token=WEBHOOK_SECRET)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    logger.info('Webhook слушает', extra={"user_id":0, "command": "system", "text":f"{WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}"})
+    await stop.wait()
+
+    # Сначала перестаём принимать запросы, затем дожидаемся начатых хендлеров
+    # и только потом закрываем приложение вместе с сессией бота
+    await site.stop()
+    if not await limiter.drain(SHUTDOWN_TIMEOUT):
+        logger.info('Не дождались хендлеров', extra={"user_id":0, "command": "system", "text":f"в работе: {limiter.in_flight}"})
+    await runner.cleanup()
 
 
 async def main():
+    if RUN_MODE == "webhook" and not WEBHOOK_SECRET:
+        # Без секрета любой, кто знает адрес, может присылать боту поддельные апдейты
+        raise SystemExit("RUN_MODE=webhook требует WEBHOOK_SECRET: задайте длинный случайный токен")
     await init_db()
+    if AUDIT_BATCHING:
+        audit_writer.start()
+    snapshots = SnapshotScheduler(take_snapshot, get_last_snapshot_time, SNAPSHOT_INTERVAL_HOURS * 3600)
+    snapshots.start()
+    partition_maintainer = PartitionMaintainer(maintain_partitions, PARTITION_CHECK_HOURS * 3600)
+    partition_maintainer.start()
 
-    bot= Bot(token=BOT_TOKEN)
+    bot = create_bot()
+    low_stock.start(bot.send_message, LOW_STOCK_ALERT_IDS or sorted(ALLOWED_USER_IDS))
     dp = Dispatcher()
+    limiter = ConcurrencyLimitMiddleware(HANDLER_CONCURRENCY)
+    dp.update.outer_middleware(limiter)
     dp.include_router(router)
 
-    logger.info('Бот запущен', extra={"user_id":0, "command": "system", "text":"startup"})
+    logger.info('Бот запущен', extra={"user_id":0, "command": "system", "text":f"startup: {RUN_MODE}"})
 
-    await dp.start_polling(bot)
+    try:
+        if RUN_MODE == "webhook":
+            await run_webhook(bot, dp, limiter)
+        else:
+            metrics_runner = await start_metrics_server() if METRICS_PORT else None
+            try:
+                await dp.start_polling(bot)
+                await limiter.drain(SHUTDOWN_TIMEOUT)
+            finally:
+                if metrics_runner:
+                    await metrics_runner.cleanup()
+    finally:
+        await low_stock.stop()
+        await partition_maintainer.stop()
+        await snapshots.stop()
+        await audit_writer.stop()
+        report_runner.shutdown()
+        logger.info('Бот остановлен', extra={"user_id":0, "command": "system", "text":"shutdown"})
+        stop_logger()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
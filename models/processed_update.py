@@ -0,0 +1,12 @@
+from sqlalchemy import Column, BigInteger, DateTime
+from sqlalchemy.sql import func
+from .base import Base
+
+class ProcessedUpdate(Base):
+    # update_id апдейтов Telegram, изменения по которым уже закоммичены. Уникальность
+    # живёт здесь, а не в transactions: у секционированной таблицы уникальный индекс
+    # обязан включать timestamp, и одна пакетная команда пишет в журнал несколько строк
+    __tablename__ = "processed_updates"
+
+    update_id = Column(BigInteger, primary_key=True, autoincrement=False)
+    processed_at = Column(DateTime, server_default=func.now(), nullable=False, index=True)
@@ -0,0 +1,20 @@
+from sqlalchemy import Column, String, Integer, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from .base import Base
+
+class SnapshotRun(Base):
+    __tablename__ = "snapshot_runs"
+
+    id = Column(Integer, primary_key=True)
+    taken_at = Column(DateTime, server_default=func.now(), nullable=False, index=True)
+    # Последняя операция журнала, уже учтённая в снимке
+    last_transaction_id = Column(Integer, nullable=False, default=0)
+
+
+class StockSnapshot(Base):
+    __tablename__ = "stock_snapshots"
+
+    run_id = Column(Integer, ForeignKey("snapshot_runs.id", ondelete="CASCADE"), primary_key=True)
+    artikul = Column(String, primary_key=True)
+    name = Column(String, nullable=False)
+    quantity = Column(Integer, nullable=False)
\ No newline at end of file
@@ -1,12 +1,38 @@
-from sqlalchemy import Column, String, Integer
+from sqlalchemy import Column, String, Integer, Index, DDL, event, func, text
 from .base import Base
 
 class Stock(Base):
     __tablename__ = "stock"
+    __table_args__ = (
+        # Триграммный GIN-индекс для /find; создаётся только в Postgres
+        Index(
+            "ix_stock_name_trgm", "name",
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+        # Частичный индекс для /low: в нём только товары ниже минимального остатка
+        Index(
+            "ix_stock_low", "artikul",
+            postgresql_where=text("quantity < min_quantity"),
+            sqlite_where=text("quantity < min_quantity"),
+        ),
+    )
 
     artikul = Column(String, primary_key=True, nullable=False)
     name = Column(String, nullable=False)
     quantity = Column(Integer, nullable=False, default=0)
+    # Порог для оповещений и /low; 0 — не отслеживать
+    min_quantity = Column(Integer, nullable=False, default=0, server_default="0")
 
     def __repr__(self):
-        return f"<Stock(artikul={self.artikul}, name={self.name}, quantity={self.quantity})>"
\ No newline at end of file
+        return f"<Stock(artikul={self.artikul}, name={self.name}, quantity={self.quantity})>"
+
+
+event.listen(
+    Stock.__table__,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
+
+# Одно название — один товар, без учёта регистра; на этот индекс опирается new_item
+Index("ux_stock_name_lower", func.lower(Stock.name), unique=True)
\ No newline at end of file
@@ -1,9 +1,14 @@
-from sqlalchemy import Column, String, Integer, DateTime, BigInteger
+from sqlalchemy import Column, String, Integer, DateTime, BigInteger, Index
 from sqlalchemy.sql import func
 from .base import Base
 
 class Transaction(Base):
     __tablename__ = "transactions"
+    __table_args__ = (
+        Index("ix_transactions_artikul_timestamp", "artikul", "timestamp"),
+        Index("ix_transactions_user_id_timestamp", "user_id", "timestamp"),
+        Index("ix_transactions_type_timestamp", "type", "timestamp"),
+    )
     
     id = Column(Integer, primary_key=True)
     artikul = Column(String, nullable=False)
@@ -13,4 +18,8 @@ class Transaction(Base):
     new_quantity = Column(Integer)
     user_id = Column(BigInteger, nullable=False)
     details = Column(String)
-    timestamp = Column(DateTime, server_default=func.now())
\ No newline at end of file
+    # Апдейт Telegram, породивший операцию (NULL — импорт из старых версий и служебные записи)
+    update_id = Column(BigInteger)
+    # В Postgres таблица секционирована по месяцам timestamp (core/partitions.py),
+    # поэтому первичный ключ там составной: (id, timestamp)
+    timestamp = Column(DateTime, server_default=func.now(), nullable=False)
\ No newline at end of file
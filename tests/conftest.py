@@ -0,0 +1,22 @@
+import asyncio
+import os
+import tempfile
+
+import pytest
+
+# Настройки читаются при импорте core, поэтому окружение задаётся до него:
+# тесты идут на отдельной SQLite-базе во временном каталоге
+os.environ["DATABASE_URL"] = "sqlite+aiosqlite:///" + os.path.join(tempfile.mkdtemp(prefix="warehouse-tests-"), "test.db")
+os.environ["SEED_TEST_DATA"] = "0"
+os.environ["SNAPSHOT_INTERVAL_HOURS"] = "0"
+
+
+@pytest.fixture(scope="session")
+def run():
+    # Один цикл событий на все тесты: asyncio.Lock очереди записи SQLite привязывается к циклу
+    from core.database import init_db, engine
+
+    with asyncio.Runner() as runner:
+        runner.run(init_db())
+        yield runner.run
+        runner.run(engine.dispose())
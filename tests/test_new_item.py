@@ -0,0 +1,31 @@
+from core import database
+from core.database import new_item, find_items
+
+
+def test_duplicate_artikul(run):
+    assert run(new_item("N-001", "Мышь для дубликатов", 1))[0]
+    success, message = run(new_item("N-001", "Другое название", 1))
+    assert not success
+    assert message == "Артикул N-001 уже существует! Товар: Мышь для дубликатов"
+
+
+def test_duplicate_name_case_insensitive(run):
+    assert run(new_item("N-002", "Mouse", 1))[0]
+    success, message = run(new_item("N-003", "mouse", 1))
+    assert not success
+    assert message.startswith("Товар с названием «mouse» уже существует!\nАртикул: N-002\nНазвание: Mouse")
+
+
+def test_duplicate_cyrillic_name_case_insensitive(run):
+    # Встроенный lower() SQLite не знает кириллицу, его заменяет юникодный
+    assert run(new_item("N-004", "Мышь беспроводная", 1))[0]
+    success, message = run(new_item("N-005", "МЫШЬ БЕСПРОВОДНАЯ", 1))
+    assert not success
+    assert "Артикул: N-004" in message
+
+
+def test_find_fallback_cyrillic(run, monkeypatch):
+    # Без индекса в памяти /find ищет подстроку запросом к БД
+    monkeypatch.setattr(database, "_search_ready", False)
+    assert run(new_item("N-006", "Кабель Оптический", 1))[0]
+    assert [row[0] for row in run(find_items("оптический"))] == ["N-006"]
@@ -0,0 +1,114 @@
+import asyncio
+import os
+
+import pytest
+from sqlalchemy import delete, insert, select, func
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from core.database import DB_URL, new_item, add_quantity, remove_quantity, get_session, _add_statement, _remove_statement
+from core.engine import engine_options, attach_sqlite_pragmas
+from models.stock import Stock
+from models.transactions import Transaction
+
+
+async def _state(artikul):
+    async with get_session() as session:
+        quantity = (await session.execute(select(Stock.quantity).where(Stock.artikul == artikul))).scalar_one()
+        result = await session.execute(
+            select(Transaction.type, func.count()).where(Transaction.artikul == artikul).group_by(Transaction.type)
+        )
+        return quantity, dict(result.all())
+
+
+def test_parallel_add_and_remove(run):
+    async def scenario():
+        assert (await new_item("T-001", "Тест параллельных изменений", 1))[0]
+        assert await add_quantity("T-001", 100, 1)
+        results = await asyncio.gather(
+            *(remove_quantity("T-001", 1, 1) for _ in range(60)),
+            *(add_quantity("T-001", 2, 1) for _ in range(40)),
+        )
+        return results, await _state("T-001")
+
+    results, (quantity, journal) = run(scenario())
+    assert all(result[0] for result in results[:60])
+    assert all(results[60:])
+    assert quantity == 100 - 60 + 40 * 2
+    assert journal == {"new_item": 1, "add": 41, "remove": 60}
+
+
+def test_parallel_remove_never_oversells(run):
+    async def scenario():
+        assert (await new_item("T-002", "Тест списания в ноль", 1))[0]
+        assert await add_quantity("T-002", 10, 1)
+        results = await asyncio.gather(*(remove_quantity("T-002", 1, 1) for _ in range(25)))
+        return results, await _state("T-002")
+
+    results, (quantity, journal) = run(scenario())
+    assert sum(success for success, _ in results) == 10
+    assert all(message.startswith("Недостаточно") for success, message in results if not success)
+    assert quantity == 0
+    assert journal == {"new_item": 1, "add": 1, "remove": 10}
+
+
+# Замки процесса (_write_lock SQLite, замки по артикулу, advisory-замки Postgres) упорядочили бы
+# писателей и без защищённого UPDATE. Здесь те же UPDATE ... RETURNING идут из двух независимых
+# движков в обход них — как из разных воркеров. Postgres проверяется, если задан TEST_PG_URL
+GUARDED_URLS = [DB_URL] + ([os.environ["TEST_PG_URL"]] if os.environ.get("TEST_PG_URL") else [])
+
+
+async def _independent_engines(url, artikul, quantity):
+    engines = [create_async_engine(url, **engine_options(url)) for _ in range(2)]
+    for engine in engines:
+        if engine.dialect.name == "sqlite":
+            attach_sqlite_pragmas(engine.sync_engine)
+    async with engines[0].begin() as conn:
+        await conn.run_sync(lambda sync: Stock.__table__.create(sync, checkfirst=True))
+        await conn.execute(delete(Stock).where(Stock.artikul == artikul))
+        await conn.execute(insert(Stock).values(artikul=artikul, name=f"Тест {artikul}", quantity=quantity))
+    return engines
+
+
+async def _apply(engine, statement):
+    async with engine.begin() as conn:
+        row = (await conn.execute(statement)).one_or_none()
+        # Транзакция держится открытой, пока остальные задачи шлют свои UPDATE
+        await asyncio.sleep(0)
+        return row
+
+
+async def _final(engines, artikul):
+    async with engines[0].begin() as conn:
+        quantity = (await conn.execute(select(Stock.quantity).where(Stock.artikul == artikul))).scalar_one()
+        await conn.execute(delete(Stock).where(Stock.artikul == artikul))
+    for engine in engines:
+        await engine.dispose()
+    return quantity
+
+
+@pytest.mark.parametrize("url", GUARDED_URLS, ids=lambda url: url.split(":", 1)[0])
+def test_guarded_update_without_process_locks(run, url):
+    async def scenario():
+        engines = await _independent_engines(url, "T-003", 100)
+        rows = await asyncio.gather(
+            *(_apply(engines[i % 2], _remove_statement("T-003", 1)) for i in range(60)),
+            *(_apply(engines[i % 2], _add_statement("T-003", 2)) for i in range(40)),
+        )
+        return rows, await _final(engines, "T-003")
+
+    rows, quantity = run(scenario())
+    assert all(row is not None for row in rows)
+    assert quantity == 100 - 60 + 40 * 2
+
+
+@pytest.mark.parametrize("url", GUARDED_URLS, ids=lambda url: url.split(":", 1)[0])
+def test_guarded_remove_rejects_overdraw_without_process_locks(run, url):
+    async def scenario():
+        engines = await _independent_engines(url, "T-004", 10)
+        rows = await asyncio.gather(*(_apply(engines[i % 2], _remove_statement("T-004", 1)) for i in range(25)))
+        return rows, await _final(engines, "T-004")
+
+    rows, quantity = run(scenario())
+    assert sum(row is not None for row in rows) == 10
+    assert sorted(row.quantity for row in rows if row is not None) == list(range(10))
+    assert quantity == 0
@@ -0,0 +1,32 @@
+from contextlib import asynccontextmanager
+
+from core import database
+from core.database import new_item, add_quantity, get_item
+
+
+def test_read_does_not_cache_row_older_than_write(run, monkeypatch):
+    # Писатель успевает закоммитить и обновить кэш между SELECT в get_item и заполнением кэша
+    assert database.stock_cache.enabled
+    assert run(new_item("C-001", "Хаб USB", 1))[0]
+    # Промах кэша: строка вытеснена, и кэш больше не считается полной копией таблицы
+    database.stock_cache.discard("C-001")
+    monkeypatch.setattr(database.stock_cache, "complete", False)
+    read_session = database.read_session
+
+    @asynccontextmanager
+    async def racing_read_session(user_id=None):
+        async with read_session(user_id) as session:
+            execute = session.execute
+
+            async def execute_then_write(*args, **kwargs):
+                result = await execute(*args, **kwargs)
+                assert await add_quantity("C-001", 5, 1)
+                return result
+
+            session.execute = execute_then_write
+            yield session
+
+    monkeypatch.setattr(database, "read_session", racing_read_session)
+    assert run(get_item("C-001")) == ("Хаб USB", 0)
+    monkeypatch.setattr(database, "read_session", read_session)
+    assert run(get_item("C-001")) == ("Хаб USB", 5)